@@ -2,14 +2,32 @@
 
 from ._version import __version__
 
+from .adaptive_mesh import refine_quadtree
+from .circ_opt import optimize_circuit
+from .compile_cache import CompilationCache
+from .datasets import (gen_parity, gen_parity_to_file, save_dataset,
+                       load_dataset, to_data_set)
+from .distributed import DistributedEvaluator, serve
 from .encoder import QEncoder
-from .encoding_circ import x_product
-from .postprocessing import measure_top, prob_one
-from .preprocessing import id_func
+from .encoding_circ import x_product, amplitude
+from .kernel import QuantumKernel, KernelSVM
+from .parallel import SharedDataset, ParallelEvaluator
+from .postprocessing import (measure_top, prob_one, PackedShots, pack_shots,
+                             shots_to_counts, format_shots, counts_prob_one,
+                             counts_marginals, counts_parity)
+from .preprocessing import (id_func, Preprocessor, AngleScaler, Standardizer,
+                            PCAProjector, Pipeline)
 from .proc_circ import (LAYER_XZ_OPTIONS_DEFAULT, layer_xz,
                         layer_single_x, layer_controlled_z)
 from .processor import QProcessor
+from .profiling import PROFILER, Profiler, count_gates
 from .qclassifier import QClassifier
-from .training import crossentropy
+from .shot_log import ShotLog, param_hash
+from .simulator import StatevectorSimulator, parse_program, sample_outcomes
+from .sweep import (SWEEP_OPTIONS_DEFAULT, grid_search_space,
+                    random_search_space, run_sweep, write_results_table)
+from .training import (crossentropy, save_checkpoint, load_checkpoint,
+                       data_fingerprint, SPSA_OPTIONS_DEFAULT,
+                       spsa_minimize)
 from .xor_example import (group0, group1, XOR_TRAINING_DATA,
                           gen_xor)
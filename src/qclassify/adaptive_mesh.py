@@ -0,0 +1,115 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Adaptive sampling of a function of two variables on a quadtree, for mapping
+the decision boundary of a classifier with few evaluations.
+
+The function is first evaluated on a coarse grid. Every cell whose corner
+values lie on both sides of a threshold, or differ by more than a tolerance,
+is split into four, down to a maximum depth. Points are placed on the lattice
+of the finest level, so that corners shared by neighbouring cells are
+evaluated only once.
+"""
+
+import numpy as np
+from scipy.interpolate import griddata
+
+def refine_quadtree(func, xmin, xmax, ymin, ymax, ncoarse=10, max_depth=3,
+		    threshold=0.5, tol=0.1):
+
+	"""
+	Samples a function of two variables adaptively.
+
+	Args:
+		func: function
+			Takes an array of points of shape (M, 2) and returns
+			an array of M values.
+		xmin, xmax, ymin, ymax: float
+			Range of the sampled region.
+		ncoarse: int
+			Number of points of the coarse grid in each dimension.
+		max_depth: int
+			Number of times a coarse cell may be split.
+		threshold: float
+			Cells whose corner values lie on both sides of this
+			value are refined.
+		tol: float
+			Cells whose corner values differ by more than this are
+			refined.
+
+	Returns:
+		A dictionary with the entries
+			points: array of shape (M, 2) of the sampled points
+			values: array of shape (M,) of the function values
+			x, y: coordinates of the finest grid
+			field: values interpolated on the finest grid, of
+				shape (len(y), len(x))
+	"""
+
+	scale = 2**max_depth
+	nfine = (ncoarse-1)*scale + 1
+	x = np.linspace(xmin, xmax, nfine)
+	y = np.linspace(ymin, ymax, nfine)
+
+	# Function values, by lattice coordinates (i, j) of the finest grid
+	values = {}
+
+	def evaluate(nodes):
+		nodes = [node for node in set(nodes) if node not in values]
+		if nodes:
+			points = np.array([[x[i], y[j]] for i, j in nodes])
+			for node, value in zip(nodes, np.ravel(func(points))):
+				values[node] = float(value)
+
+	def corners(cell):
+		i, j, size = cell
+		return [(i, j), (i+size, j), (i, j+size), (i+size, j+size)]
+
+	cells = [(i*scale, j*scale, scale) for i in range(0, ncoarse-1)
+		 for j in range(0, ncoarse-1)]
+	evaluate([node for cell in cells for node in corners(cell)])
+
+	while cells:
+		split = []
+		for cell in cells:
+			if cell[2] == 1:
+				continue
+			vals = [values[node] for node in corners(cell)]
+			low, high = min(vals), max(vals)
+			if (low < threshold <= high) or high - low > tol:
+				i, j, size = cell
+				half = size//2
+				split += [(i, j, half), (i+half, j, half),
+					  (i, j+half, half), (i+half, j+half, half)]
+		evaluate([node for cell in split for node in corners(cell)])
+		cells = split
+
+	nodes = sorted(values)
+	points = np.array([[x[i], y[j]] for i, j in nodes])
+	vals = np.array([values[node] for node in nodes])
+
+	X, Y = np.meshgrid(x, y)
+	field = griddata(points, vals, (X, Y), method='linear')
+
+	return {
+		'points':points,
+		'values':vals,
+		'x':x,
+		'y':y,
+		'field':field,
+	}
@@ -0,0 +1,156 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Lightweight peephole optimization of pyquil Programs, applied before the
+circuits are compiled or simulated.
+
+For every gate, the pass looks back through the gates already emitted on the
+same qubits, skipping gates it commutes with (gates on other qubits, and
+diagonal gates such as CZ and RZ when the gate is diagonal as well), and
+	* merges consecutive rotations about the same axis,
+	* cancels pairs of identical self-inverse gates, such as two CZ gates
+	  on the same pair of qubits,
+	* drops rotations whose angle is a multiple of 2 pi.
+Overall phases are ignored, so the pass must not be applied to circuits
+which are later controlled on other qubits.
+"""
+
+from math import pi
+
+import numpy as np
+
+from pyquil.gates import RX, RY, RZ, PHASE
+from pyquil.quil import Program
+from pyquil.quilbase import Declare, Gate, Measurement
+
+from qclassify.profiling import count_gates
+
+# Rotations which add up when applied consecutively
+ROTATIONS = {
+	'RX': RX,
+	'RY': RY,
+	'RZ': RZ,
+	'PHASE': PHASE,
+}
+
+# Gates which are their own inverse
+SELF_INVERSE = set(['I', 'X', 'Y', 'Z', 'H', 'CZ', 'CNOT', 'SWAP'])
+
+# Gates which are diagonal in the computational basis, hence commute
+DIAGONAL = set(['I', 'Z', 'S', 'T', 'RZ', 'PHASE', 'CZ', 'CPHASE'])
+
+# Two-qubit gates which are symmetric in their qubits
+SYMMETRIC = set(['CZ', 'SWAP', 'CPHASE'])
+
+def _angle(gate):
+
+	"""
+	Rotation angle of a gate, or None if it is not a plain number.
+	"""
+
+	param = gate.params[0]
+	if isinstance(param, (int, float, complex, np.number)):
+		return float(np.real(param))
+	return None
+
+def _is_multiple_of_2pi(angle, atol=1e-10):
+	return abs((angle + pi) % (2*pi) - pi) < atol
+
+def _qubits(gate):
+	return [q.index for q in gate.qubits]
+
+def _same_qubits(first, second):
+	if first.name in SYMMETRIC:
+		return set(_qubits(first)) == set(_qubits(second))
+	return _qubits(first) == _qubits(second)
+
+def optimize_circuit(program):
+
+	"""
+	Applies the peephole optimization to a pyquil Program.
+
+	Args:
+		program: pyquil Program
+			Circuit to be optimized.
+
+	Returns:
+		A tuple (optimized, report) where optimized is a new pyquil
+		Program and report is a dictionary with the entries gates_before
+		and gates_after.
+	"""
+
+	out = []
+	for instr in program.instructions:
+
+		if not isinstance(instr, Gate) or instr.modifiers:
+			out.append(instr)
+			continue
+
+		qubits = set(_qubits(instr))
+		rotation = instr.name in ROTATIONS and len(qubits) == 1 and\
+			_angle(instr) is not None
+
+		if rotation and _is_multiple_of_2pi(_angle(instr)):
+			continue
+
+		keep = True
+		for k in range(len(out)-1, -1, -1):
+			prev = out[k]
+			if prev is None or isinstance(prev, Declare):
+				continue
+			if isinstance(prev, Measurement):
+				if prev.qubit.index in qubits:
+					break
+				continue
+			if not isinstance(prev, Gate) or prev.modifiers:
+				break
+			if not qubits & set(_qubits(prev)):
+				continue
+
+			if prev.name == instr.name and _same_qubits(prev, instr):
+				if rotation and _angle(prev) is not None:
+					angle = _angle(prev) + _angle(instr)
+					if _is_multiple_of_2pi(angle):
+						out[k] = None
+					else:
+						out[k] = ROTATIONS[instr.name](
+							angle, _qubits(instr)[0])
+					keep = False
+					break
+				if instr.name in SELF_INVERSE:
+					out[k] = None
+					keep = False
+					break
+
+			if prev.name in DIAGONAL and instr.name in DIAGONAL:
+				continue
+			break
+
+		if keep:
+			out.append(instr)
+
+	optimized = Program()
+	for instr in out:
+		if instr is not None:
+			optimized.inst(instr)
+
+	report = {
+		'gates_before':count_gates(program),
+		'gates_after':count_gates(optimized),
+	}
+	return optimized, report
@@ -0,0 +1,196 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Persistent cache of compiled executables, shared between processes.
+
+Entries are stored as one file per compiled circuit in a local directory and
+addressed by a hash of the Quil text of the circuit, its number of shots and
+the name of the target device. Files are written under a temporary name and
+renamed into place, so readers never see partial entries. When the total
+size of the entries exceeds a bound, the least recently used ones are
+deleted.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+try:
+	import fcntl
+except ImportError:	# not available on Windows
+	fcntl = None
+
+class CompilationCache(object):
+
+	"""
+	Content-addressed on-disk cache of compiled executables.
+	"""
+
+	def __init__(self, directory, max_bytes=2**30):
+
+		"""
+		Args:
+			directory: string
+				Directory holding the cache entries. It is
+				created if needed and may be shared by many
+				processes.
+			max_bytes: int
+				Bound on the total size of the entries.
+		"""
+
+		self.directory = directory
+		self.max_bytes = max_bytes
+		os.makedirs(directory, exist_ok=True)
+
+		# Estimated total size of the entries, refreshed on eviction
+		self._size = self._scan_size()
+
+		self.hits = 0
+		self.misses = 0
+
+	def key(self, program, device):
+
+		"""
+		Canonical hash of a circuit for a target device.
+
+		Args:
+			program: pyquil Program
+				Circuit, including its number of shots.
+			device: string
+				Name of the target device.
+		"""
+
+		text = '\n'.join([device, str(program.num_shots), program.out()])
+		return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+	def _path(self, key):
+		return os.path.join(self.directory, key+'.pkl')
+
+	def get(self, key):
+
+		"""
+		Returns the cached object for a key, or None if there is none.
+		"""
+
+		path = self._path(key)
+		try:
+			with open(path, 'rb') as f:
+				value = pickle.load(f)
+		except (OSError, EOFError, pickle.UnpicklingError):
+			return None
+
+		# Mark the entry as recently used
+		try:
+			os.utime(path)
+		except OSError:
+			pass
+		return value
+
+	def put(self, key, value):
+
+		"""
+		Stores an object under a key.
+		"""
+
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		with os.fdopen(fd, 'wb') as f:
+			pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+			size = f.tell()
+		os.replace(tmp_path, self._path(key))
+
+		self._size += size
+		if self._size > self.max_bytes:
+			self.evict()
+
+	def compile(self, program, forest_cxn, device):
+
+		"""
+		Compiles a circuit to an executable for a quantum computer,
+		reusing the cached executable if there is one.
+
+		Args:
+			program: pyquil Program
+				Circuit wrapped in its numshots loop.
+			forest_cxn: pyquil QuantumComputer
+				Connection whose compiler is used on a miss.
+			device: string
+				Name of the target device.
+		"""
+
+		key = self.key(program, device)
+		executable = self.get(key)
+		if executable is not None:
+			self.hits += 1
+			return executable
+
+		self.misses += 1
+		native = forest_cxn.compiler.quil_to_native_quil(program)
+		executable = forest_cxn.compiler.native_quil_to_executable(native)
+		self.put(key, executable)
+		return executable
+
+	def _entries(self):
+		out = []
+		for entry in os.scandir(self.directory):
+			if not entry.name.endswith('.pkl'):
+				continue
+			try:
+				stat = entry.stat()
+			except OSError:
+				continue
+			out.append((stat.st_mtime, stat.st_size, entry.path))
+		return out
+
+	def _scan_size(self):
+		return sum(size for mtime, size, path in self._entries())
+
+	def evict(self):
+
+		"""
+		Deletes the least recently used entries until the total size is
+		within the bound. Only one process evicts at a time.
+		"""
+
+		with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+			if fcntl is not None:
+				fcntl.flock(lock, fcntl.LOCK_EX)
+			entries = sorted(self._entries())
+			total = sum(size for mtime, size, path in entries)
+			for mtime, size, path in entries:
+				if total <= self.max_bytes:
+					break
+				try:
+					os.remove(path)
+				except OSError:
+					pass
+				total -= size
+			self._size = total
+
+	def clear(self):
+
+		"""
+		Deletes every entry.
+		"""
+
+		for mtime, size, path in self._entries():
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+		self._size = 0
@@ -0,0 +1,188 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Synthetic labelled data sets for testing the classifier at scale.
+
+Data sets are returned as a pair (features, labels) of numpy arrays of shapes
+(num_points, ndims) and (num_points,). Use to_data_set to obtain the list of
+(feature, label) tuples taken by QClassifier.test and QClassifier.train.
+"""
+
+import os
+from math import pi
+
+import numpy as np
+
+def gen_parity(num_points, ndims, delta=pi/10, frac_one=0.5, label_noise=0.0,
+	       low=0.0, high=pi, seed=None, dtype=np.float64):
+
+	"""
+	Generates a parity (n-dimensional XOR) data set. Each point lies near a
+	corner of a hypercube, whose coordinates are low or high in every
+	dimension, and is labelled by the parity of the number of coordinates
+	equal to high.
+
+	Args:
+		num_points: int
+			Number of data points.
+		ndims: int
+			Number of features.
+		delta: float
+			Range of the uniform perturbation of each coordinate
+			around its corner.
+		frac_one: float
+			Expected fraction of points labelled 1, for generating
+			imbalanced classes.
+		label_noise: float
+			Probability that the label of a point is flipped.
+		low, high: float or list[float]
+			Coordinates of the corners, per dimension if lists.
+		seed: int
+			Seed of the random number generator.
+		dtype: numpy dtype
+			Floating point type of the features.
+
+	Returns:
+		A tuple (features, labels) of numpy arrays.
+	"""
+
+	return _gen_parity(np.random.default_rng(seed), num_points, ndims,
+			   delta, frac_one, label_noise, low, high, dtype)
+
+def _gen_parity(rng, num_points, ndims, delta, frac_one, label_noise, low,
+		high, dtype):
+
+	labels = (rng.random(num_points) < frac_one).astype(np.int8)
+
+	# Corners with the requested parity: the last bit fixes the parity
+	bits = rng.integers(0, 2, size=(num_points, ndims), dtype=np.int8)
+	bits[:, -1] = labels ^ (bits[:, :-1].sum(axis=1) % 2)
+
+	low = np.asarray(low, dtype=dtype)
+	high = np.asarray(high, dtype=dtype)
+	features = low + bits*(high - low)
+	features += rng.uniform(-delta, delta,
+				size=(num_points, ndims)).astype(dtype)
+
+	if label_noise > 0:
+		labels ^= (rng.random(num_points) < label_noise).astype(np.int8)
+
+	return features.astype(dtype, copy=False), labels
+
+def gen_parity_to_file(directory, num_points, ndims, chunk_size=2**20,
+		       seed=None, dtype=np.float64, **options):
+
+	"""
+	Generates a parity data set chunk by chunk directly into memory-mapped
+	files, so that data sets larger than the memory can be produced. The
+	files can be opened with load_dataset.
+
+	Args:
+		directory: string
+			Directory where the files features.npy and labels.npy
+			are written.
+		num_points, ndims, seed, dtype:
+			See gen_parity.
+		chunk_size: int
+			Number of points generated at a time.
+		options:
+			Further arguments of gen_parity (delta, frac_one,
+			label_noise, low, high).
+
+	Returns:
+		A tuple (features, labels) of read-only memory-mapped arrays.
+	"""
+
+	settings = {'delta':pi/10, 'frac_one':0.5, 'label_noise':0.0,
+		    'low':0.0, 'high':pi}
+	settings.update(options)
+
+	features, labels = _open_dataset(directory, num_points, ndims, dtype)
+	rng = np.random.default_rng(seed)
+	for start in range(0, num_points, chunk_size):
+		stop = min(start+chunk_size, num_points)
+		features[start:stop], labels[start:stop] = _gen_parity(rng,
+			stop-start, ndims, settings['delta'],
+			settings['frac_one'], settings['label_noise'],
+			settings['low'], settings['high'], dtype)
+	features.flush()
+	labels.flush()
+	del features, labels
+
+	return load_dataset(directory)
+
+def _open_dataset(directory, num_points, ndims, dtype):
+
+	os.makedirs(directory, exist_ok=True)
+	features = np.lib.format.open_memmap(
+		os.path.join(directory, 'features.npy'), mode='w+',
+		dtype=dtype, shape=(num_points, ndims))
+	labels = np.lib.format.open_memmap(
+		os.path.join(directory, 'labels.npy'), mode='w+',
+		dtype=np.int8, shape=(num_points,))
+	return features, labels
+
+def save_dataset(directory, features, labels):
+
+	"""
+	Writes a data set to the files features.npy and labels.npy of a
+	directory, which can be memory-mapped by load_dataset.
+	"""
+
+	features = np.asarray(features)
+	labels = np.asarray(labels)
+	out_features, out_labels = _open_dataset(directory, len(features),
+						 features.shape[1],
+						 features.dtype)
+	out_features[:] = features
+	out_labels[:] = labels
+	out_features.flush()
+	out_labels.flush()
+
+def load_dataset(directory, mmap_mode='r'):
+
+	"""
+	Opens a data set written by save_dataset or gen_parity_to_file.
+
+	Args:
+		directory: string
+			Directory holding features.npy and labels.npy.
+		mmap_mode: string
+			Memory-mapping mode passed to numpy.load, or None to
+			read the arrays into memory.
+
+	Returns:
+		A tuple (features, labels) of numpy arrays.
+	"""
+
+	features = np.load(os.path.join(directory, 'features.npy'),
+			   mmap_mode=mmap_mode)
+	labels = np.load(os.path.join(directory, 'labels.npy'),
+			 mmap_mode=mmap_mode)
+	return features, labels
+
+def to_data_set(features, labels):
+
+	"""
+	Converts arrays of features and labels into the list of tuples
+		(feature, label)
+	used by QClassifier.test and QClassifier.train.
+	"""
+
+	return list(zip(np.asarray(features).tolist(),
+			np.asarray(labels).tolist()))
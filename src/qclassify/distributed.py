@@ -0,0 +1,502 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Evaluation of the classifier on a data set by worker processes on remote
+hosts, over TCP.
+
+Workers are started on every node with
+
+	QCLASSIFY_SECRET=... python -m qclassify.distributed --host 10.0.0.5
+
+and serve one coordinator at a time. The coordinator (DistributedEvaluator)
+sends each worker the classifier and the features once, then for every
+parameter vector splits the data set into shards of consecutive indices and
+hands them out to idle workers. Workers send heartbeats while they compute.
+A worker which disconnects or stays silent for longer than the heartbeat
+timeout is dropped and its shard is given to another worker. Conversely,
+workers probe an idle coordinator with TCP keepalives, every heartbeat
+interval, and drop the connection after _KEEPALIVE_PROBES unanswered probes,
+so that a coordinator whose host fails without closing the connection does
+not block a worker forever.
+
+Every message is a header of 5 bytes, the message type (unsigned byte) and
+the length of the payload (unsigned 32-bit integer, network order), followed
+by the payload:
+	SETUP		pickled (qclassifier, features)
+	EVALUATE	shard, start, stop, nparams (unsigned 32-bit integers,
+			network order) followed by the parameters as
+			little-endian float64
+	RESULT		shard, count (unsigned 32-bit integers, network order)
+			followed by the outputs as little-endian float64
+	HEARTBEAT	empty
+	ERROR		error message in UTF-8
+	SHUTDOWN	empty
+	CHALLENGE	random nonce sent by the worker when a coordinator
+			connects
+The classical postprocessing of the classifier must return numbers.
+
+Security: the SETUP message is unpickled by the worker, and unpickling data
+from an untrusted peer runs arbitrary code. The coordinator and the workers
+therefore share a secret (the secret arguments, or the environment variable
+QCLASSIFY_SECRET), and the SETUP payload starts with an HMAC-SHA256 of the
+nonce of the connection and the pickled data under this secret. Workers
+verify it before unpickling, and close connections which do not start with
+an authenticated SETUP. Messages are not encrypted, and anyone who knows the
+secret can run code on the workers, so workers listen on the loopback
+interface by default and should only be exposed on trusted networks.
+"""
+
+import argparse
+import collections
+import hashlib
+import hmac
+import os
+import pickle
+import select
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+SETUP = 1
+EVALUATE = 2
+RESULT = 3
+HEARTBEAT = 4
+ERROR = 5
+SHUTDOWN = 6
+CHALLENGE = 7
+
+_HEADER = struct.Struct('!BI')
+_EVALUATE = struct.Struct('!IIII')
+_RESULT = struct.Struct('!II')
+_FLOATS = np.dtype('<f8')
+_NONCE_SIZE = 16
+_MAC_SIZE = hashlib.sha256().digest_size
+_KEEPALIVE_PROBES = 5
+
+def _get_secret(secret):
+
+	if secret is None:
+		secret = os.environ.get('QCLASSIFY_SECRET')
+	if not secret:
+		raise ValueError('Distributed evaluation requires a shared'
+				 ' secret, see distributed.py')
+	if isinstance(secret, str):
+		secret = secret.encode('utf-8')
+	return secret
+
+def _enable_keepalive(sock, interval):
+
+	# The timing options are not available on every platform, in which
+	# case the system defaults apply
+	seconds = max(1, int(np.ceil(interval)))
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+	for name, value in [('TCP_KEEPIDLE', seconds),
+			    ('TCP_KEEPINTVL', seconds),
+			    ('TCP_KEEPCNT', _KEEPALIVE_PROBES),
+			    ('TCP_USER_TIMEOUT',
+			     1000*seconds*(_KEEPALIVE_PROBES+1))]:
+		if hasattr(socket, name):
+			sock.setsockopt(socket.IPPROTO_TCP,
+					getattr(socket, name), value)
+
+def _mac(secret, nonce, data):
+	return hmac.new(secret, nonce + data, hashlib.sha256).digest()
+
+def _recv_exact(sock, size):
+
+	chunks = []
+	while size > 0:
+		chunk = sock.recv(min(size, 2**20))
+		if not chunk:
+			raise ConnectionError('Connection closed by peer')
+		chunks.append(chunk)
+		size -= len(chunk)
+	return b''.join(chunks)
+
+def send_message(sock, kind, payload=b''):
+
+	"""
+	Sends one message of the protocol on a socket.
+	"""
+
+	sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+def recv_message(sock):
+
+	"""
+	Receives one message of the protocol from a socket.
+
+	Returns:
+		A tuple (kind, payload).
+	"""
+
+	kind, size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+	return kind, _recv_exact(sock, size)
+
+def encode_evaluate(shard, start, stop, params):
+	params = np.asarray(params, dtype=_FLOATS)
+	return _EVALUATE.pack(shard, start, stop, len(params)) + params.tobytes()
+
+def decode_evaluate(payload):
+	shard, start, stop, nparams = _EVALUATE.unpack_from(payload)
+	params = np.frombuffer(payload, dtype=_FLOATS, count=nparams,
+			       offset=_EVALUATE.size)
+	return shard, start, stop, params
+
+def encode_result(shard, outputs):
+	outputs = np.asarray(outputs, dtype=_FLOATS)
+	return _RESULT.pack(shard, len(outputs)) + outputs.tobytes()
+
+def decode_result(payload):
+	shard, count = _RESULT.unpack_from(payload)
+	outputs = np.frombuffer(payload, dtype=_FLOATS, count=count,
+				offset=_RESULT.size)
+	return shard, outputs
+
+class _Heartbeat(threading.Thread):
+
+	"""
+	Sends heartbeats on a connection at regular intervals while the worker
+	is busy, until stopped.
+	"""
+
+	def __init__(self, sock, lock, interval):
+
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.sock = sock
+		self.lock = lock
+		self.interval = interval
+		self.busy = threading.Event()
+		self.stopped = threading.Event()
+
+	def run(self):
+
+		while not self.stopped.wait(self.interval):
+			if not self.busy.is_set():
+				continue
+			try:
+				with self.lock:
+					send_message(self.sock, HEARTBEAT)
+			except OSError:
+				return
+
+def _authenticate(conn, secret):
+
+	"""
+	Challenges a coordinator which just connected and returns the
+	unpickled SETUP payload, or None if it is not authenticated.
+	"""
+
+	nonce = os.urandom(_NONCE_SIZE)
+	send_message(conn, CHALLENGE, nonce)
+	kind, payload = recv_message(conn)
+	if kind != SETUP or not hmac.compare_digest(payload[:_MAC_SIZE],
+			_mac(secret, nonce, payload[_MAC_SIZE:])):
+		send_message(conn, ERROR, b'Authentication failed')
+		return None
+	return pickle.loads(payload[_MAC_SIZE:])
+
+def _serve_connection(conn, secret, heartbeat_interval):
+
+	try:
+		setup = _authenticate(conn, secret)
+	except (OSError, ConnectionError, struct.error):
+		setup = None
+	if setup is None:
+		conn.close()
+		return
+	qc, features = setup
+
+	lock = threading.Lock()
+	heartbeat = _Heartbeat(conn, lock, heartbeat_interval)
+	heartbeat.start()
+
+	try:
+		while True:
+			kind, payload = recv_message(conn)
+
+			if kind == EVALUATE:
+				shard, start, stop, params = decode_evaluate(payload)
+				heartbeat.busy.set()
+				try:
+					params = params.tolist()
+					qc.params = params
+					outputs = []
+					for i in range(start, stop):
+						qc.sample_index = i
+						qc.circuit(features[i].tolist(), params)
+						outputs.append(
+							qc.execute(qc.execute_options))
+					reply = (RESULT, encode_result(shard, outputs))
+				except Exception as error:
+					reply = (ERROR, repr(error).encode('utf-8'))
+				heartbeat.busy.clear()
+				with lock:
+					send_message(conn, *reply)
+
+			elif kind == SHUTDOWN:
+				return
+	except (OSError, struct.error):
+		# Closed, reset or timed out by the keepalive probes
+		return
+	finally:
+		heartbeat.stopped.set()
+		conn.close()
+
+def serve(host='127.0.0.1', port=5555, heartbeat_interval=1.0, once=False,
+	  secret=None):
+
+	"""
+	Runs a worker, serving coordinators one after the other.
+
+	Args:
+		host: string
+			Address to listen on, the loopback interface by
+			default. See the security note of the module before
+			listening on other interfaces.
+		port: int
+			Port to listen on.
+		heartbeat_interval: float
+			Seconds between heartbeats sent to the coordinator,
+			and between keepalive probes of an idle
+			coordinator.
+		once: bool
+			Whether to return after serving one coordinator.
+		secret: string or bytes
+			Secret shared with the coordinators, the environment
+			variable QCLASSIFY_SECRET if None.
+	"""
+
+	secret = _get_secret(secret)
+	server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	server.bind((host, port))
+	server.listen(1)
+	try:
+		while True:
+			conn, address = server.accept()
+			conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			conn.settimeout(None)
+			_enable_keepalive(conn, heartbeat_interval)
+			_serve_connection(conn, secret, heartbeat_interval)
+			if once:
+				return
+	finally:
+		server.close()
+
+class DistributedEvaluator(object):
+
+	"""
+	Evaluates a quantum classifier on a fixed data set for many parameter
+	vectors, with workers on remote hosts. Has the interface of
+	ParallelEvaluator.
+	"""
+
+	def __init__(self, qclassifier, data_set, workers, shards_per_worker=4,
+		     heartbeat_timeout=10.0, max_retries=3, connect_timeout=10.0,
+		     secret=None):
+
+		"""
+		Args:
+			qclassifier: QClassifier
+				Classifier to be evaluated. Each worker keeps
+				its own copy (see QClassifier.worker_copy),
+				including its execution options.
+			data_set: list[(list,{0,1})]
+				A list of tuples (feature, label).
+			workers: list[(string, int)]
+				Addresses (host, port) of running workers.
+			shards_per_worker: int
+				Number of shards per worker and evaluation, for
+				balancing the load.
+			heartbeat_timeout: float
+				Seconds of silence after which a busy worker is
+				considered lost.
+			max_retries: int
+				Number of times a shard is handed out again
+				after its worker was lost.
+			connect_timeout: float
+				Seconds allowed for connecting to a worker.
+			secret: string or bytes
+				Secret shared with the workers, the environment
+				variable QCLASSIFY_SECRET if None.
+		"""
+
+		secret = _get_secret(secret)
+
+		self.features = np.array([tuple[0] for tuple in data_set],
+					 dtype=float)
+		self.labels = [tuple[1] for tuple in data_set]
+		self.size = len(data_set)
+		self.nshards = max(1, min(self.size,
+					  len(workers)*shards_per_worker))
+		self.heartbeat_timeout = heartbeat_timeout
+		self.max_retries = max_retries
+
+		setup = pickle.dumps((qclassifier.worker_copy(), self.features),
+				     protocol=pickle.HIGHEST_PROTOCOL)
+		self.workers = []
+		for address in workers:
+			sock = socket.create_connection(tuple(address),
+							timeout=connect_timeout)
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			kind, nonce = recv_message(sock)
+			if kind != CHALLENGE:
+				sock.close()
+				raise ConnectionError('Unexpected message from'
+						      ' worker '+str(address))
+			send_message(sock, SETUP,
+				     _mac(secret, nonce, setup) + setup)
+			sock.settimeout(heartbeat_timeout)
+			self.workers.append(sock)
+
+		# Number of shards handed out again, over all evaluations
+		self.retries = 0
+
+	def _drop(self, sock):
+		self.workers.remove(sock)
+		try:
+			sock.close()
+		except OSError:
+			pass
+
+	def outputs(self, params):
+
+		"""
+		Returns the classifier outputs for every data point as a numpy
+		array, for a given parameter vector.
+		"""
+
+		bounds = np.linspace(0, self.size, self.nshards+1).astype(int)
+		pending = collections.deque(range(0, self.nshards))
+		attempts = [0]*self.nshards
+		outputs = np.empty(self.size)
+		assigned = {}		# worker -> shard
+		last_seen = {}		# worker -> time of its last message
+		done = 0
+
+		while done < self.nshards:
+
+			# Hand out shards to idle workers
+			for sock in list(self.workers):
+				if not pending:
+					break
+				if sock in assigned:
+					continue
+				shard = pending.popleft()
+				try:
+					send_message(sock, EVALUATE, encode_evaluate(
+						shard, bounds[shard], bounds[shard+1],
+						params))
+				except OSError:
+					pending.appendleft(shard)
+					self._drop(sock)
+					continue
+				assigned[sock] = shard
+				last_seen[sock] = time.time()
+
+			if not assigned:
+				raise RuntimeError('No workers left for the'
+						   ' evaluation')
+
+			readable = select.select(list(assigned), [], [],
+						 self.heartbeat_timeout)[0]
+			now = time.time()
+			lost = [sock for sock in assigned if sock not in readable
+				and now - last_seen[sock] > self.heartbeat_timeout]
+
+			for sock in readable:
+				try:
+					kind, payload = recv_message(sock)
+				except (OSError, ConnectionError):
+					lost.append(sock)
+					continue
+				last_seen[sock] = now
+				if kind == RESULT:
+					shard, values = decode_result(payload)
+					outputs[bounds[shard]:bounds[shard+1]] = values
+					del assigned[sock]
+					done += 1
+				elif kind == ERROR:
+					raise RuntimeError('Worker error: '+
+							   payload.decode('utf-8'))
+
+			# Give the shards of lost workers to other workers
+			for sock in lost:
+				shard = assigned.pop(sock)
+				attempts[shard] += 1
+				if attempts[shard] > self.max_retries:
+					raise RuntimeError('Shard %d failed %d times'
+						% (shard, attempts[shard]))
+				pending.append(shard)
+				self.retries += 1
+				self._drop(sock)
+
+		return outputs
+
+	def test(self, params, objective_func):
+
+		"""
+		Evaluates an objective function on the data set, like
+		QClassifier.test, for a given parameter vector.
+		"""
+
+		outputs = self.outputs(params)
+		return objective_func([(self.features[i], self.labels[i],
+					outputs[i])
+				       for i in range(0, self.size)])
+
+	def close(self):
+
+		"""
+		Releases the workers, which go back to waiting for a
+		coordinator.
+		"""
+
+		for sock in list(self.workers):
+			try:
+				send_message(sock, SHUTDOWN)
+			except OSError:
+				pass
+			self._drop(sock)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+		return False
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Worker for distributed evaluation of a quantum'
+			    ' classifier.')
+	parser.add_argument('--host', default='127.0.0.1',
+			    help='address to listen on (see the security note'
+				 ' of the module before changing it)')
+	parser.add_argument('--port', type=int, default=5555)
+	parser.add_argument('--heartbeat', type=float, default=1.0,
+			    help='seconds between heartbeats')
+	args = parser.parse_args()
+
+	serve(args.host, args.port, args.heartbeat)
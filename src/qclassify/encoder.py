@@ -17,6 +17,8 @@
 
 from qclassify.preprocessing import *
 from qclassify.encoding_circ import *
+from qclassify.profiling import PROFILER, count_gates
+from qclassify.simulator import StatevectorSimulator
 
 class QEncoder(object):
 
@@ -48,7 +50,10 @@ class QEncoder(object):
 					Name of a function which preprocesses
 					the input vector into another vector
 					which is perhaps more suitable for
-					quantum circuit construction.
+					quantum circuit construction. This
+					may also be a Preprocessor object,
+					which is fitted on the training set
+					(see fit).
 				encoding_circ: function handle
 					Name of a function which takes a
 					vector and returns a circuit (a pyquil
@@ -60,6 +65,14 @@ class QEncoder(object):
 		self.preprocessor = options['preprocessing']
 		self.generator = options['encoding_circ']
 
+		# Optional dictionary of previously generated circuits. It may be
+		# shared between encoders (e.g. across the trials of a sweep),
+		# hence the keys include the encoding scheme and the qubits.
+		self.cache = None
+
+		# Preprocessed vectors of the last batch, keyed by the input
+		self.preprocessed = {}
+
 	def circuit(self, input_vec):
 
 		"""
@@ -72,7 +85,120 @@ class QEncoder(object):
 
 		"""
 
-		self.__input_vec = self.preprocessor(input_vec)
-		self.qcircuit = self.generator(self.__input_vec,\
-					self.qubits_chosen)
+		with PROFILER.stage('encoder.circuit') as stage:
+
+			if self.cache is not None:
+				key = (self.preprocessor, self.generator,
+				       tuple(self.qubits_chosen), tuple(input_vec))
+				if key in self.cache:
+					self.qcircuit = self.cache[key]
+					return self.qcircuit
+
+			self.__input_vec = self.preprocessed.get(tuple(input_vec))
+			if self.__input_vec is None:
+				self.__input_vec = self.preprocessor(input_vec)
+			self.qcircuit = self.generator(self.__input_vec,\
+						self.qubits_chosen)
+
+			if self.cache is not None:
+				self.cache[key] = self.qcircuit
+
+			if PROFILER.enabled:
+				stage.add(gates=count_gates(self.qcircuit))
+
 		return self.qcircuit
+
+	def fit(self, data):
+
+		"""
+		Fits the preprocessor, if it is a Preprocessor object, to a set
+		of input vectors. Previously preprocessed vectors and cached
+		circuits of this preprocessor are discarded.
+
+		Args:
+			data: list[list[float]]
+				Input vectors, typically the training set.
+		"""
+
+		if not hasattr(self.preprocessor, 'fit'):
+			return
+
+		self.preprocessor.fit(data)
+		self.preprocessed = {}
+		if self.cache is not None:
+			for key in [key for key in self.cache
+				    if key[0] is self.preprocessor]:
+				del self.cache[key]
+
+	def preprocess(self, data):
+
+		"""
+		Preprocesses a set of input vectors in one batch and keeps the
+		results for the subsequent calls of circuit, in place of those
+		of the previous batch.
+
+		Args:
+			data: list[list[float]]
+				Input vectors.
+
+		Returns:
+			List of the preprocessed vectors.
+		"""
+
+		keys = [tuple(input_vec) for input_vec in data]
+		vectors = self._transform(keys)
+		self.preprocessed = dict(zip(keys, vectors))
+		return vectors
+
+	def _transform(self, keys):
+
+		"""
+		Preprocesses input vectors, given as tuples, in one batch,
+		reusing the vectors of the last batch but without keeping the
+		results.
+		"""
+
+		found = dict((key, self.preprocessed[key]) for key in keys
+			     if key in self.preprocessed)
+		missing = [key for key in set(keys) if key not in found]
+
+		if missing:
+			if hasattr(self.preprocessor, 'transform'):
+				vectors = self.preprocessor.transform(missing)
+			else:
+				vectors = [self.preprocessor(list(key))
+					   for key in missing]
+			found.update(zip(missing, vectors))
+
+		return [found[key] for key in keys]
+
+	def states(self, data, dtype=np.complex128):
+
+		"""
+		Computes the statevectors prepared by the encoding circuit for a
+		set of input vectors. If the encoding circuit generator provides
+		a 'state' fast path (see encoding_circ.py) the amplitudes are
+		computed directly, otherwise the circuits are simulated.
+
+		Args:
+			data: list[list[float]]
+				Input vectors.
+			dtype: numpy dtype
+				Complex type of the amplitudes.
+
+		Returns:
+			A numpy array of shape (len(data), 2^n), with
+			qubits_chosen[0] as the most significant qubit.
+		"""
+
+		vectors = self._transform([tuple(input_vec) for input_vec in data])
+
+		if hasattr(self.generator, 'state'):
+			return np.array([self.generator.state(vector,
+							      self.qubits_chosen)
+					 for vector in vectors], dtype=dtype)
+
+		sim = StatevectorSimulator(self.qubits_chosen, dtype)
+		return np.concatenate([sim.flatten(sim.apply_program(
+			sim.zero_state(), self.circuit(input_vec)))
+			for input_vec in data])
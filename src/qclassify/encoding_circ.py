@@ -18,8 +18,19 @@
 """
 Generators of quantum circuits which encodes a classical input vector into a
 quantum state.
+
+A generator may provide a fast path for local simulators as its 'state'
+attribute: a function taking the same arguments and returning the prepared
+statevector (see simulator.py). It may also provide the fidelity kernel
+between the encoded states in closed form as its 'kernel' attribute: a
+function taking two arrays of input vectors and the chosen qubits, and
+returning the matrix of the overlaps |<psi(x)|psi(x')>|^2 (see kernel.py).
 """
 
+from math import cos, sin
+
+import numpy as np
+
 from pyquil.gates import *
 from pyquil.quil import Program
 
@@ -46,3 +57,155 @@ def x_product(input_vec, qubits_chosen):
 	for i in range(0, len(qubits_chosen)):
 		out = out + Program(RX(input_vec[i], qubits_chosen[i]))
 	return out
+
+def x_product_state(input_vec, qubits_chosen):
+
+	"""
+	Statevector prepared by x_product, computed directly as a tensor
+	product. Used by local simulators instead of simulating the gates.
+
+	Args:
+		input_vec: list[float]
+			Classical input vector.
+		qubits_chosen: list[int]
+			List of indices of qubits that are chosen for the
+			circuit to act on.
+
+	Returns:
+		A numpy array of 2^n amplitudes, with qubits_chosen[0] as the
+		most significant qubit.
+	"""
+
+	out = np.ones(1)
+	for i in range(0, len(qubits_chosen)):
+		out = np.kron(out, [cos(input_vec[i]/2), -1j*sin(input_vec[i]/2)])
+	return out
+
+x_product.state = x_product_state
+
+def x_product_kernel(vectors1, vectors2, qubits_chosen):
+
+	"""
+	Fidelity kernel between the product states prepared by x_product,
+		|<psi(x)|psi(x')>|^2 = prod_i cos^2((x_i - x'_i)/2),
+	computed without the statevectors.
+
+	Args:
+		vectors1, vectors2: numpy array
+			Input vectors, of shapes (N1, n) and (N2, n).
+		qubits_chosen: list[int]
+			List of indices of qubits that are chosen for the
+			circuit to act on.
+
+	Returns:
+		A numpy array of shape (N1, N2).
+	"""
+
+	nqubits = len(qubits_chosen)
+	vectors1 = np.asarray(vectors1, dtype=float)[:, :nqubits]
+	vectors2 = np.asarray(vectors2, dtype=float)[:, :nqubits]
+	out = np.ones((len(vectors1), len(vectors2)))
+	for i in range(0, nqubits):
+		out *= np.cos((vectors1[:, i, None] - vectors2[None, :, i])/2)**2
+	return out
+
+x_product.kernel = x_product_kernel
+
+def amplitude_vector(input_vec, nqubits):
+
+	"""
+	Pads a classical vector with zeros to length 2^nqubits and normalizes
+	it, giving the amplitudes used by the amplitude encoding.
+	"""
+
+	vec = np.zeros(2**nqubits)
+	input_vec = np.asarray(input_vec, dtype=float)
+	if len(input_vec) > len(vec):
+		raise ValueError('Cannot encode %d features into %d qubits'
+				 % (len(input_vec), nqubits))
+	vec[:len(input_vec)] = input_vec
+	norm = np.linalg.norm(vec)
+	if norm == 0:
+		raise ValueError('Cannot amplitude-encode the zero vector')
+	return vec/norm
+
+def amplitude(input_vec, qubits_chosen):
+
+	"""
+	Encoding circuit which represents a real classical vector
+		(x0, x1, ..., x_{N-1})
+	of length N <= 2^n with the n-qubit state
+		sum_j x_j |j> / |x|
+	where |j> has qubits_chosen[0] as its most significant qubit. Shorter
+	vectors are padded with zeros. The state is prepared with a cascade of
+	uniformly controlled RY rotations (see Mottonen et al.
+	arXiv:quant-ph/0407010), using 2^n-1 RY and at most 2^n-2 CNOT gates.
+
+	Args:
+		input_vec: list[float]
+			Classical input vector.
+		qubits_chosen: list[int]
+			List of indices of qubits that are chosen for the
+			circuit to act on.
+
+	Returns:
+		A pyquil Program representing the circuit.
+	"""
+
+	nqubits = len(qubits_chosen)
+	vec = amplitude_vector(input_vec, nqubits)
+
+	out = Program()
+	for k in range(0, nqubits):
+		# Split every block of amplitudes sharing the values of the
+		# first k qubits according to the value of qubit k
+		blocks = vec.reshape(2**k, 2, -1)
+		if k == nqubits-1:
+			angles = 2*np.arctan2(blocks[:, 1, 0], blocks[:, 0, 0])
+		else:
+			norms = np.linalg.norm(blocks, axis=2)
+			angles = 2*np.arctan2(norms[:, 1], norms[:, 0])
+		out = out + _uniformly_controlled_ry(angles,
+						     qubits_chosen[:k],
+						     qubits_chosen[k])
+	return out
+
+def _uniformly_controlled_ry(angles, controls, target):
+
+	"""
+	Circuit applying RY(angles[j]) to the target qubit when the control
+	qubits are in the basis state |j>, with controls[0] as the most
+	significant bit of j.
+	"""
+
+	ncontrols = len(controls)
+	if ncontrols == 0:
+		return Program(RY(angles[0], target))
+
+	# Gray code sequence and the bit flipped after each of its entries
+	size = 2**ncontrols
+	gray = [i ^ (i >> 1) for i in range(0, size)]
+	flipped = [gray[i] ^ gray[(i+1) % size] for i in range(0, size)]
+
+	# Rotation angles solving angles[j] = sum_i (-1)^(j.gray[i]) alpha[i]
+	signs = np.array([[(-1)**bin(j & g).count('1') for g in gray]
+			  for j in range(0, size)])
+	alphas = signs.T.dot(angles)/size
+
+	out = Program()
+	for i in range(0, size):
+		out = out + Program(RY(alphas[i], target))
+		control = controls[ncontrols-flipped[i].bit_length()]
+		out = out + Program(CNOT(control, target))
+	return out
+
+def amplitude_state(input_vec, qubits_chosen):
+
+	"""
+	Statevector prepared by amplitude, loaded directly by local simulators
+	instead of simulating the state preparation gates.
+	"""
+
+	return amplitude_vector(input_vec, len(qubits_chosen))
+
+amplitude.state = amplitude_state
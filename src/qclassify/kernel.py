@@ -0,0 +1,226 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Kernel methods with the fidelity kernel of a quantum encoder,
+	K(x, x') = |<psi(x)|psi(x')>|^2,
+where |psi(x)> is the state prepared by the encoding circuit.
+
+The kernel is computed in closed form when the encoding circuit generator
+provides a 'kernel' attribute (see encoding_circ.py), and from batches of
+simulated statevectors otherwise. Kernel matrices are computed block by
+block, so that they can be streamed into memory-mapped arrays.
+
+Example:
+	kernel = QuantumKernel(qclassifier.qencoder)
+	svm = KernelSVM().fit(kernel.matrix(train_features), train_labels)
+	predictions = svm.predict(kernel.matrix(test_features, train_features))
+"""
+
+import numpy as np
+from scipy.optimize import minimize
+
+from qclassify.profiling import PROFILER
+
+class QuantumKernel(object):
+
+	"""
+	Fidelity kernel of the states prepared by a quantum encoder.
+	"""
+
+	def __init__(self, qencoder, block_size=1024, dtype=np.complex128):
+
+		"""
+		Args:
+			qencoder: QEncoder
+				Encoder preparing the states. Its preprocessor
+				is applied to the input vectors.
+			block_size: int
+				Number of rows and columns of the blocks of the
+				kernel matrices.
+			dtype: numpy dtype
+				Complex type of the simulated statevectors.
+		"""
+
+		self.qencoder = qencoder
+		self.block_size = block_size
+		self.dtype = dtype
+
+	def _features(self, data):
+
+		# States are only simulated when there is no closed form. The
+		# preprocessor is applied directly, so that no vectors are kept
+		if hasattr(self.qencoder.generator, 'kernel'):
+			preprocessor = self.qencoder.preprocessor
+			if hasattr(preprocessor, 'transform'):
+				vectors = preprocessor.transform(data)
+			else:
+				vectors = [preprocessor(list(input_vec))
+					   for input_vec in data]
+			return np.array(vectors, dtype=float)
+		return self.qencoder.states(data, self.dtype)
+
+	def _block(self, features1, features2):
+
+		if hasattr(self.qencoder.generator, 'kernel'):
+			return self.qencoder.generator.kernel(features1, features2,
+						self.qencoder.qubits_chosen)
+		return np.abs(features1.dot(features2.conj().T))**2
+
+	def blocks(self, data1, data2=None):
+
+		"""
+		Computes a kernel matrix block by block.
+
+		Args:
+			data1: list[list[float]]
+				Input vectors indexing the rows.
+			data2: list[list[float]]
+				Input vectors indexing the columns. If None, the
+				symmetric matrix of data1 is computed and only
+				the blocks on or above the diagonal are yielded.
+
+		Yields:
+			Tuples (row, column, block) where block is the numpy
+			array of the entries starting at (row, column).
+		"""
+
+		symmetric = data2 is None
+		size = self.block_size
+
+		# Encoded columns are computed once, rows one block at a time
+		features2 = self._features(data1 if symmetric else data2)
+
+		for row in range(0, len(data1), size):
+			if symmetric:
+				features1 = features2[row:row+size]
+			else:
+				features1 = self._features(data1[row:row+size])
+			start = row if symmetric else 0
+			for column in range(start, len(features2), size):
+				with PROFILER.stage('kernel.block'):
+					block = self._block(features1,
+						features2[column:column+size])
+				yield row, column, block
+
+	def matrix(self, data1, data2=None, out=None):
+
+		"""
+		Computes a kernel matrix.
+
+		Args:
+			data1, data2: list[list[float]]
+				See blocks.
+			out: numpy array
+				Array of shape (len(data1), len(data2)) receiving
+				the matrix, for instance a memory-mapped array
+				for matrices larger than the memory. A new array
+				if None.
+
+		Returns:
+			The kernel matrix.
+		"""
+
+		nrows = len(data1)
+		ncolumns = nrows if data2 is None else len(data2)
+		if out is None:
+			out = np.empty((nrows, ncolumns))
+
+		for row, column, block in self.blocks(data1, data2):
+			out[row:row+block.shape[0],
+			    column:column+block.shape[1]] = block
+			if data2 is None and row != column:
+				out[column:column+block.shape[1],
+				    row:row+block.shape[0]] = block.T
+		return out
+
+class KernelSVM(object):
+
+	"""
+	Support vector machine on a precomputed kernel matrix. The dual problem
+		minimize 1/2 a^T Q a - sum(a),  0 <= a_i <= C,
+	with Q_ij = y_i y_j (K_ij + 1) and labels y_i in {-1, 1}, is solved with
+	L-BFGS-B. The constant added to the kernel absorbs the bias, which
+	removes the equality constraint of the usual dual problem.
+	"""
+
+	def __init__(self, C=1.0, maxiter=1000, tol=1e-8):
+
+		"""
+		Args:
+			C: float
+				Penalty of the misclassified training points.
+			maxiter: int
+				Maximum number of iterations of L-BFGS-B.
+			tol: float
+				Tolerance of L-BFGS-B.
+		"""
+
+		self.C = C
+		self.maxiter = maxiter
+		self.tol = tol
+
+	def fit(self, kernel_matrix, labels):
+
+		"""
+		Trains the classifier.
+
+		Args:
+			kernel_matrix: numpy array
+				Kernel matrix of the training points.
+			labels: list[{0,1}]
+				Labels of the training points.
+
+		Returns:
+			self
+		"""
+
+		y = 2*np.asarray(labels, dtype=float) - 1
+		Q = (np.asarray(kernel_matrix) + 1)*np.outer(y, y)
+
+		def func(alpha):
+			Qalpha = Q.dot(alpha)
+			return 0.5*alpha.dot(Qalpha) - alpha.sum(), Qalpha - 1
+
+		res = minimize(func, np.zeros(len(y)), jac=True, method='L-BFGS-B',
+			       bounds=[(0, self.C)]*len(y),
+			       options={'maxiter':self.maxiter}, tol=self.tol)
+
+		self.dual_coef = res.x*y
+		self.support = np.nonzero(res.x > 1e-8*self.C)[0]
+		return self
+
+	def decision_function(self, kernel_matrix):
+
+		"""
+		Signed distances to the decision boundary.
+
+		Args:
+			kernel_matrix: numpy array
+				Kernel matrix between the points to classify
+				(rows) and the training points (columns).
+		"""
+
+		return (np.asarray(kernel_matrix) + 1).dot(self.dual_coef)
+
+	def predict(self, kernel_matrix):
+
+		"""
+		Predicted labels in {0, 1}, see decision_function.
+		"""
+
+		return (self.decision_function(kernel_matrix) > 0).astype(int)
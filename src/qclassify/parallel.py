@@ -0,0 +1,211 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Evaluation of the classifier on a data set with a pool of worker processes.
+
+The features and labels are placed in shared memory once. Workers attach to
+them when they start, so that every task only carries a range of indices and
+a parameter vector.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+try:
+	from multiprocessing import shared_memory
+except ImportError:	# Python < 3.8
+	shared_memory = None
+
+class SharedDataset(object):
+
+	"""
+	Features and labels of a data set held in shared memory blocks.
+	"""
+
+	def __init__(self, blocks, spec, owner):
+
+		"""
+		Use SharedDataset.create or SharedDataset.attach instead.
+		"""
+
+		self.blocks = blocks
+		self.spec = spec
+		self.owner = owner
+		self.features, self.labels = [
+			np.ndarray(shape, dtype=dtype, buffer=block.buf)
+			for block, (name, shape, dtype) in zip(blocks, spec)]
+
+	@classmethod
+	def create(cls, data_set):
+
+		"""
+		Copies a data set into new shared memory blocks.
+
+		Args:
+			data_set: list[(list,{0,1})]
+				A list of tuples (feature, label).
+		"""
+
+		if shared_memory is None:
+			raise RuntimeError('Shared memory requires Python 3.8 or'
+					   ' later')
+
+		arrays = [np.array([tuple[0] for tuple in data_set], dtype=float),
+			  np.array([tuple[1] for tuple in data_set], dtype=int)]
+		blocks = []
+		spec = []
+		for array in arrays:
+			block = shared_memory.SharedMemory(create=True,
+						size=max(array.nbytes, 1))
+			np.ndarray(array.shape, dtype=array.dtype,
+				   buffer=block.buf)[...] = array
+			blocks.append(block)
+			spec.append((block.name, array.shape, array.dtype.str))
+		return cls(blocks, spec, True)
+
+	@classmethod
+	def attach(cls, spec):
+
+		"""
+		Attaches to a data set created in another process.
+
+		Args:
+			spec: list
+				The spec attribute of the created data set.
+		"""
+
+		blocks = [shared_memory.SharedMemory(name=name)
+			  for name, shape, dtype in spec]
+		return cls(blocks, spec, False)
+
+	def close(self):
+
+		"""
+		Detaches from the shared memory, and frees it in the process which
+		created it.
+		"""
+
+		self.features = self.labels = None
+		for block in self.blocks:
+			block.close()
+			if self.owner:
+				block.unlink()
+		self.blocks = []
+
+# State of an evaluation worker process
+_WORKER = {}
+
+def _init_worker(qclassifier, spec):
+
+	_WORKER['qc'] = qclassifier
+	_WORKER['data'] = SharedDataset.attach(spec)
+
+def _evaluate_range(args):
+
+	start, stop, params = args
+
+	qc = _WORKER['qc']
+	features = _WORKER['data'].features
+
+	qc.params = params
+	outputs = []
+	for i in range(start, stop):
+		qc.sample_index = i
+		qc.circuit(features[i].tolist(), params)
+		outputs.append(qc.execute(qc.execute_options))
+	return outputs
+
+class ParallelEvaluator(object):
+
+	"""
+	Evaluates a quantum classifier on a fixed data set for many parameter
+	vectors, with a pool of worker processes sharing the data set.
+	"""
+
+	def __init__(self, qclassifier, data_set, nprocs=None, chunks_per_proc=4):
+
+		"""
+		Args:
+			qclassifier: QClassifier
+				Classifier to be evaluated. Each worker keeps
+				its own copy (see QClassifier.worker_copy),
+				including its execution options.
+			data_set: list[(list,{0,1})]
+				A list of tuples (feature, label).
+			nprocs: int
+				Number of worker processes, None for the number
+				of CPUs.
+			chunks_per_proc: int
+				Number of index ranges per worker and evaluation,
+				for balancing the load.
+		"""
+
+		if nprocs is None:
+			nprocs = multiprocessing.cpu_count()
+
+		self.data = SharedDataset.create(data_set)
+		self.size = len(data_set)
+		self.nchunks = max(1, min(self.size, nprocs*chunks_per_proc))
+		self.pool = multiprocessing.Pool(nprocs, initializer=_init_worker,
+						 initargs=(qclassifier.worker_copy(),
+							   self.data.spec))
+
+	def outputs(self, params):
+
+		"""
+		Returns the classifier outputs for every data point as a numpy
+		array, for a given parameter vector.
+		"""
+
+		bounds = np.linspace(0, self.size, self.nchunks+1).astype(int)
+		params = [float(x) for x in params]
+		tasks = [(bounds[k], bounds[k+1], params)
+			 for k in range(0, self.nchunks)]
+		results = self.pool.map(_evaluate_range, tasks)
+		return np.array([output for outputs in results
+				 for output in outputs])
+
+	def test(self, params, objective_func):
+
+		"""
+		Evaluates an objective function on the data set, like
+		QClassifier.test, for a given parameter vector.
+		"""
+
+		outputs = self.outputs(params)
+		return objective_func([(self.data.features[i],
+					self.data.labels[i], outputs[i])
+				       for i in range(0, self.size)])
+
+	def close(self):
+
+		"""
+		Stops the workers and frees the shared memory.
+		"""
+
+		self.pool.terminate()
+		self.pool.join()
+		self.data.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+		return False
@@ -46,22 +46,218 @@ def measure_top(qubit_chosen):
 	out = out + MEASURE(qubit_chosen, ro[0])
 	return out
 
+## Compact representations of measurement outcomes ##
+# The raw outcomes are an nshots x nbits array of 0, 1 values, with column k
+# holding the readout bit ro[k].
+
+class PackedShots(object):
+
+	"""
+	Measurement outcomes stored with 8 shots per byte for each readout bit.
+	"""
+
+	def __init__(self, data, nshots):
+
+		"""
+		Args:
+			data: numpy array of uint8
+				Outcomes packed along the shot axis, with shape
+				(ceil(nshots/8), nbits).
+			nshots: int
+				Number of shots.
+		"""
+
+		self.data = data
+		self.nshots = nshots
+		self.nbits = data.shape[1]
+
+	def unpack(self):
+
+		"""
+		Returns the nshots x nbits array of outcomes.
+		"""
+
+		return np.unpackbits(self.data, axis=0)[:self.nshots]
+
+	def ones(self):
+
+		"""
+		Returns the number of shots in which each readout bit is 1.
+		"""
+
+		return _POPCOUNT[self.data].sum(axis=0)
+
+# Number of bits set in each byte
+_POPCOUNT = np.array([bin(x).count('1') for x in range(256)], dtype=np.int64)
+
+def _as_shots(qubit_outcome):
+
+	shots = np.asarray(qubit_outcome, dtype=np.uint8)
+	if shots.ndim == 1:
+		shots = shots.reshape(-1, 1)
+	return shots
+
+def pack_shots(qubit_outcome):
+
+	"""
+	Packs measurement outcomes into a PackedShots object.
+
+	Args:
+		qubit_outcome: list[list[{0,1}]]
+			Outcomes of repeated measurement, one row per shot.
+	"""
+
+	shots = _as_shots(qubit_outcome)
+	return PackedShots(np.packbits(shots, axis=0), shots.shape[0])
+
+def shots_to_counts(qubit_outcome):
+
+	"""
+	Histogram of the measured bitstrings.
+
+	Args:
+		qubit_outcome: list[list[{0,1}]]
+			Outcomes of repeated measurement, one row per shot.
+
+	Returns:
+		A dictionary mapping each observed outcome, as an integer whose
+		k-th bit is the readout bit ro[k], to its number of occurrences.
+	"""
+
+	shots = _as_shots(qubit_outcome)
+	weights = np.left_shift(np.uint64(1),
+				np.arange(shots.shape[1], dtype=np.uint64))
+	outcomes = shots.astype(np.uint64).dot(weights)
+	values, counts = np.unique(outcomes, return_counts=True)
+	return dict(zip(values.tolist(), counts.tolist()))
+
+def format_shots(qubit_outcome, result_format):
+
+	"""
+	Converts raw measurement outcomes into the chosen representation.
+
+	Args:
+		qubit_outcome: list[list[{0,1}]]
+			Outcomes of repeated measurement, one row per shot.
+		result_format: string
+			'shots' for the outcomes unchanged, 'counts' for
+			shots_to_counts and 'packed' for pack_shots.
+	"""
+
+	if result_format == 'shots':
+		return qubit_outcome
+	if result_format == 'counts':
+		return shots_to_counts(qubit_outcome)
+	if result_format == 'packed':
+		return pack_shots(qubit_outcome)
+	raise ValueError('Unknown result format '+str(result_format))
+
 ## Classical steps for processing measurement outcomes ##
-# Here we assume that the outcomes are a list of lists containing 0, 1 values
+# Here we assume that the outcomes are a list of lists containing 0, 1 values,
+# a histogram from shots_to_counts or a PackedShots object.
 
 def prob_one(qubit_outcome):
 
 	"""
-	Computes the probability of measuring |1> in a given qubit.
+	Computes the probability of measuring |1> in a given qubit, the one
+	read into readout bit ro[0]. Further readout bits are ignored, whatever
+	the representation of the outcomes.
 
 	Args:
 		qubit_outcome: list[{0,1}]
 			A list of 0, 1 values representing the outcomes of
-			repeated measurement.
+			repeated measurement, or a list of lists with one row
+			per shot. Histograms of outcomes and PackedShots
+			objects are accepted as well.
 	"""
 
+	if isinstance(qubit_outcome, dict):
+		return counts_prob_one(qubit_outcome)
+	if isinstance(qubit_outcome, PackedShots):
+		return qubit_outcome.ones()[0]/qubit_outcome.nshots
+
 	# in case the input is not a list but a list of lists
-	input_vec = np.asarray(qubit_outcome)
-	input_vec.shape = input_vec.size
+	shots = _as_shots(qubit_outcome)
+
+	return np.count_nonzero(shots[:, 0])/shots.shape[0]
+
+def _counts_arrays(counts):
+
+	outcomes = np.fromiter(counts.keys(), dtype=np.uint64,
+			       count=len(counts))
+	weights = np.fromiter(counts.values(), dtype=np.float64,
+			      count=len(counts))
+	return outcomes, weights
+
+def counts_prob_one(counts, bit=0):
+
+	"""
+	Computes the probability that a readout bit is 1 from a histogram of
+	outcomes.
+
+	Args:
+		counts: dictionary
+			Histogram of outcomes, see shots_to_counts. The values
+			may also be probabilities.
+		bit: int
+			Index k of the readout bit ro[k].
+	"""
+
+	return counts_marginals(counts, [bit])[0]
+
+def counts_marginals(counts, bits):
+
+	"""
+	Computes the probability that each of several readout bits is 1 from a
+	histogram of outcomes.
+
+	Args:
+		counts: dictionary
+			Histogram of outcomes, see shots_to_counts.
+		bits: list[int]
+			Indices of the readout bits.
+
+	Returns:
+		A numpy array with one probability per readout bit.
+	"""
+
+	outcomes, weights = _counts_arrays(counts)
+	bits = np.asarray(bits, dtype=np.uint64)
+	ones = (outcomes[:, None] >> bits[None, :]) & np.uint64(1)
+	return weights.dot(ones)/weights.sum()
+
+def counts_parity(counts, bits):
+
+	"""
+	Computes the probability that an odd number of the chosen readout bits
+	are 1, from a histogram of outcomes.
+
+	Args:
+		counts: dictionary
+			Histogram of outcomes, see shots_to_counts.
+		bits: list[int]
+			Indices of the readout bits.
+	"""
+
+	outcomes, weights = _counts_arrays(counts)
+	parity = np.zeros(len(outcomes), dtype=np.uint64)
+	for b in bits:
+		parity ^= (outcomes >> np.uint64(b)) & np.uint64(1)
+	return weights.dot(parity)/weights.sum()
+
+## Vectorized versions for batches of packed outcomes ##
+# A batch is a uint8 array of shape (nrecords, ceil(nshots/8), nbits) holding
+# the data of PackedShots objects with the same number of shots and bits, as
+# gathered by ShotLog.replay. A classical function f may provide its
+# vectorized version as f.batch(batch, nshots, ...).
+
+def counts_prob_one_batch(batch, nshots, bit=0):
+	return _POPCOUNT[batch[:, :, bit]].sum(axis=1)/nshots
+
+def counts_parity_batch(batch, nshots, bits):
+	shots = np.unpackbits(batch[:, :, list(bits)], axis=1)[:, :nshots]
+	return np.bitwise_xor.reduce(shots, axis=2).sum(axis=1)/nshots
 
-	return sum(input_vec)/len(input_vec)
+prob_one.batch = counts_prob_one_batch
+counts_prob_one.batch = counts_prob_one_batch
+counts_parity.batch = counts_parity_batch
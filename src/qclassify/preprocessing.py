@@ -26,3 +26,158 @@ import numpy as np
 
 def id_func(input_data):
 	return input_data
+
+class Preprocessor(object):
+
+	"""
+	Base class for preprocessing stages which are fitted once on a training
+	set and then applied to whole arrays of data vectors. An instance can
+	be used wherever a preprocessing function is expected, in which case it
+	transforms a single vector.
+	"""
+
+	def __init__(self):
+		self.fitted = False
+
+	def fit(self, data):
+
+		"""
+		Fits the stage to a data set.
+
+		Args:
+			data: list[list[float]]
+				Data vectors, one per row.
+		"""
+
+		self._fit(np.asarray(data, dtype=float))
+		self.fitted = True
+		return self
+
+	def transform(self, data):
+
+		"""
+		Applies the stage to a data set.
+
+		Args:
+			data: list[list[float]]
+				Data vectors, one per row.
+
+		Returns:
+			A numpy array with one transformed vector per row.
+		"""
+
+		if not self.fitted:
+			raise RuntimeError(type(self).__name__+
+					   ' must be fitted before use')
+		return self._transform(np.asarray(data, dtype=float))
+
+	def fit_transform(self, data):
+		return self.fit(data).transform(data)
+
+	def __call__(self, input_vec):
+		return self.transform([input_vec])[0]
+
+	def _fit(self, data):
+		pass
+
+	def _transform(self, data):
+		return data
+
+class AngleScaler(Preprocessor):
+
+	"""
+	Scales every feature linearly so that its range on the training set is
+	mapped onto a range of rotation angles.
+	"""
+
+	def __init__(self, low=0, high=math.pi):
+
+		"""
+		Args:
+			low, high: float
+				Angles to which the minimum and the maximum of
+				each feature are mapped.
+		"""
+
+		Preprocessor.__init__(self)
+		self.low = low
+		self.high = high
+
+	def _fit(self, data):
+		self.min = data.min(axis=0)
+		span = data.max(axis=0) - self.min
+		self.scale = (self.high - self.low)/np.where(span > 0, span, 1)
+
+	def _transform(self, data):
+		return self.low + (data - self.min)*self.scale
+
+class Standardizer(Preprocessor):
+
+	"""
+	Shifts and scales every feature to zero mean and unit variance on the
+	training set.
+	"""
+
+	def _fit(self, data):
+		self.mean = data.mean(axis=0)
+		std = data.std(axis=0)
+		self.std = np.where(std > 0, std, 1)
+
+	def _transform(self, data):
+		return (data - self.mean)/self.std
+
+class PCAProjector(Preprocessor):
+
+	"""
+	Projects the data vectors onto their leading principal components on the
+	training set. Reducing the number of features this way reduces the
+	number of qubits needed by encodings such as x_product.
+	"""
+
+	def __init__(self, ncomponents):
+
+		"""
+		Args:
+			ncomponents: int
+				Number of principal components kept.
+		"""
+
+		Preprocessor.__init__(self)
+		self.ncomponents = ncomponents
+
+	def _fit(self, data):
+		self.mean = data.mean(axis=0)
+		u, s, vt = np.linalg.svd(data - self.mean, full_matrices=False)
+		self.components = vt[:self.ncomponents]
+		self.explained_variance = s[:self.ncomponents]**2/\
+			max(len(data)-1, 1)
+
+	def _transform(self, data):
+		return (data - self.mean).dot(self.components.T)
+
+class Pipeline(Preprocessor):
+
+	"""
+	Sequence of preprocessing stages, each fitted on the output of the
+	previous ones.
+	"""
+
+	def __init__(self, stages):
+
+		"""
+		Args:
+			stages: list[Preprocessor]
+				Stages in the order in which they are applied.
+		"""
+
+		Preprocessor.__init__(self)
+		self.stages = stages
+
+	def _fit(self, data):
+		for stage in self.stages:
+			data = stage.fit_transform(data)
+
+	def _transform(self, data):
+		for stage in self.stages:
+			data = stage.transform(data)
+		return data
@@ -17,6 +17,7 @@
 
 from qclassify.proc_circ import *
 from qclassify.postprocessing import *
+from qclassify.profiling import PROFILER, count_gates
 
 class QProcessor(object):
 
@@ -30,6 +31,7 @@ class QProcessor(object):
 	# explanations
 	QPROC_OPTIONS_DEFAULT={
 		'proc_circ':layer_xz,	# see proc_circ.py
+		'proc_circ_options':LAYER_XZ_OPTIONS_DEFAULT, # see proc_circ.py
 		'postprocessing':{
 			'quantum':measure_top, # see postprocessing.py
 			'classical':prob_one, # see postprocessing.py
@@ -57,6 +59,9 @@ class QProcessor(object):
 					quantum state encoding the input data
 					into another state which is amenable for
 					further information extraction.
+				proc_circ_options: dictionary
+					Options passed to proc_circ, such as
+					the number of layers of layer_xz.
 				postprocessing: dictionary
 					Set of functions which extract
 					classical information from the output
@@ -71,6 +76,8 @@ class QProcessor(object):
 		
 		self.qubits_chosen = qubits_chosen	
 		self.processor = options['proc_circ']
+		self.proc_circ_options = options.get('proc_circ_options',
+		                                     LAYER_XZ_OPTIONS_DEFAULT)
 		self.postprocessing = options['postprocessing']
 
 		self.quantum_post = self.postprocessing['quantum']
@@ -88,6 +95,35 @@ class QProcessor(object):
 		"""
 
 		self.params = params
-		self.qcircuit = self.processor(params,self.qubits_chosen) + self.quantum_post(self.qubits_chosen[0])
+
+		with PROFILER.stage('processor.circuit') as stage:
+			self.qcircuit = self.processor(params, self.qubits_chosen,
+			                               self.proc_circ_options) +\
+				self.quantum_post(self.qubits_chosen[0])
+			if PROFILER.enabled:
+				stage.add(gates=count_gates(self.qcircuit))
 
 		return self.qcircuit
+
+	def parametric_circuit(self, nparams, region='theta'):
+
+		"""
+		Generates the circuit with its parameters left symbolic, as
+		references region[0], ..., region[nparams-1] to a classical
+		memory region. Used by local simulators to evaluate many
+		parameter assignments and their gradients from one circuit.
+
+		Args:
+			nparams: int
+				Number of parameters of the processing circuit.
+			region: string
+				Name of the classical memory region.
+		"""
+
+		out = Program()
+		theta = out.declare(region, memory_type='REAL',
+				    memory_size=nparams)
+		return out + self.processor([theta[i] for i in range(nparams)],
+					    self.qubits_chosen,
+					    self.proc_circ_options) +\
+			self.quantum_post(self.qubits_chosen[0])
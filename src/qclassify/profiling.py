@@ -0,0 +1,214 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Opt-in instrumentation of the stages of circuit construction and execution.
+
+Profiling is disabled by default. Once enabled with PROFILER.enable(), every
+instrumented stage records its number of calls, its running time and sizes
+such as the number of gates or shots. Stages are named after the step they
+time, for instance 'execute.quil_to_native_quil' or 'encoder.circuit'.
+
+	from qclassify.profiling import PROFILER
+
+	PROFILER.enable()
+	qc.test(data_set)
+	print(PROFILER.summary())
+	PROFILER.export('profile.json')
+"""
+
+import csv
+import json
+import threading
+import time
+
+from pyquil.quilbase import Gate
+
+def count_gates(program):
+
+	"""
+	Number of gates in a pyquil Program.
+	"""
+
+	return sum(1 for instr in program.instructions if isinstance(instr, Gate))
+
+class _Stage(object):
+
+	"""
+	Context manager timing one call of a stage.
+	"""
+
+	def __init__(self, profiler, name, sizes):
+		self.profiler = profiler
+		self.name = name
+		self.sizes = sizes
+
+	def add(self, **sizes):
+
+		"""
+		Records sizes (e.g. gates=12) for the current call.
+		"""
+
+		self.sizes.update(sizes)
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *args):
+		self.profiler.record(self.name, time.perf_counter()-self.start,
+				     **self.sizes)
+		return False
+
+class _NullStage(object):
+
+	"""
+	Stage used while profiling is disabled. It does nothing.
+	"""
+
+	def add(self, **sizes):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+_NULL_STAGE = _NullStage()
+
+class Profiler(object):
+
+	"""
+	Registry of per-stage timings, call counts and sizes.
+	"""
+
+	def __init__(self):
+		self.enabled = False
+		self.records = {}
+		self._lock = threading.Lock()
+
+	def enable(self):
+		self.enabled = True
+
+	def disable(self):
+		self.enabled = False
+
+	def reset(self):
+
+		"""
+		Discards everything recorded so far.
+		"""
+
+		with self._lock:
+			self.records = {}
+
+	def stage(self, name, **sizes):
+
+		"""
+		Returns a context manager which times the enclosed block as one
+		call of the named stage.
+
+		Args:
+			name: string
+				Name of the stage.
+			sizes: int
+				Sizes to be recorded along with the call.
+		"""
+
+		if not self.enabled:
+			return _NULL_STAGE
+		return _Stage(self, name, sizes)
+
+	def record(self, name, elapsed, **sizes):
+
+		"""
+		Adds one call of a stage to the registry.
+
+		Args:
+			name: string
+				Name of the stage.
+			elapsed: float
+				Running time of the call in seconds.
+			sizes: int
+				Sizes of the call, which are summed over calls.
+		"""
+
+		with self._lock:
+			record = self.records.get(name)
+			if record is None:
+				record = {'count':0, 'total_time':0.0,
+					  'min_time':elapsed, 'max_time':elapsed,
+					  'sizes':{}}
+				self.records[name] = record
+			record['count'] += 1
+			record['total_time'] += elapsed
+			record['min_time'] = min(record['min_time'], elapsed)
+			record['max_time'] = max(record['max_time'], elapsed)
+			for key, value in sizes.items():
+				record['sizes'][key] =\
+					record['sizes'].get(key, 0) + value
+
+	def summary(self):
+
+		"""
+		Returns a dictionary mapping each stage to its statistics: count,
+		total_time, mean_time, min_time, max_time and the total of each
+		recorded size.
+		"""
+
+		out = {}
+		with self._lock:
+			for name, record in self.records.items():
+				entry = {'count':record['count'],
+					 'total_time':record['total_time'],
+					 'mean_time':record['total_time']/\
+						record['count'],
+					 'min_time':record['min_time'],
+					 'max_time':record['max_time']}
+				entry.update(record['sizes'])
+				out[name] = entry
+		return out
+
+	def export(self, filename):
+
+		"""
+		Writes the summary to a file, as CSV if the file name ends with
+		.csv and as JSON otherwise.
+		"""
+
+		summary = self.summary()
+
+		if filename.endswith('.csv'):
+			columns = ['stage']
+			for entry in summary.values():
+				for key in entry:
+					if key not in columns:
+						columns.append(key)
+			with open(filename, 'w', newline='') as f:
+				writer = csv.DictWriter(f, fieldnames=columns)
+				writer.writeheader()
+				for name, entry in summary.items():
+					row = {'stage':name}
+					row.update(entry)
+					writer.writerow(row)
+		else:
+			with open(filename, 'w') as f:
+				json.dump(summary, f, indent=2, sort_keys=True)
+
+# Registry used by the instrumented code
+PROFILER = Profiler()
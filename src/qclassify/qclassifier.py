@@ -18,6 +18,9 @@
 from scipy.optimize import minimize
 from numpy.random import uniform
 from math import pi
+import copy
+import multiprocessing
+import os
 
 import matplotlib.pyplot as plt
 from matplotlib import cm
@@ -26,10 +29,110 @@ from pyquil.api import get_qc
 from qclassify.encoder import *
 from qclassify.processor import *
 from qclassify.training import *
+from qclassify.profiling import PROFILER, count_gates
+from qclassify.adaptive_mesh import refine_quadtree
+from qclassify.circ_opt import optimize_circuit
+from qclassify.compile_cache import CompilationCache
+from qclassify.distributed import DistributedEvaluator
+from qclassify.parallel import ParallelEvaluator
+from qclassify.shot_log import ShotLog
+from qclassify.simulator import (StatevectorSimulator, parse_program,
+                                 sample_outcomes)
 
 # Training data set
 from qclassify.xor_example import *
 
+class _TrainingStopped(Exception):
+
+	"""
+	Raised by the training callback to end the optimization early.
+	"""
+
+	pass
+
+# State of a multi-start training worker process
+_MULTISTART = {}
+
+def _multistart_init(qclassifier, training_data, objective_func):
+
+	_MULTISTART['qc'] = qclassifier
+	_MULTISTART['training_data'] = training_data
+	_MULTISTART['objective_func'] = objective_func
+	np.random.seed()
+
+def _multistart_segment(args):
+
+	"""
+	Continues a Nelder-Mead optimization from a given simplex for a number
+	of iterations. Returns the final simplex with its objective values and
+	the loss of the best vertex after every iteration.
+	"""
+
+	simplex, values, maxiter, xatol, fatol = args
+
+	qc = _MULTISTART['qc']
+	training_data = _MULTISTART['training_data']
+	objective_func = _MULTISTART['objective_func']
+
+	# Vertices evaluated in previous segments are not evaluated again
+	evaluated = dict(zip([tuple(x) for x in simplex], values))
+
+	def targetfunc(params):
+		key = tuple(params)
+		if key not in evaluated:
+			qc.params = params
+			evaluated[key] = qc.test(training_data,
+					{'objective_func':objective_func})
+		return evaluated[key]
+
+	losses = []
+
+	def callback_func(params):
+		losses.append(float(targetfunc(params)))
+
+	res = minimize(targetfunc, simplex[0], args=(),
+		       method='Nelder-Mead', tol=1e-2,
+		       callback=callback_func,
+		       options={'disp': False,
+				'initial_simplex': simplex,
+				'maxiter': maxiter,
+				'xatol': xatol,
+				'return_all': False,
+				'fatol': fatol})
+
+	vertices, vertex_values = res.final_simplex
+	converged = res.nit < maxiter
+	return vertices, vertex_values, losses, converged
+
+# Connections to quantum computers and compilation caches of this process
+_QC_CONNECTIONS = {}
+_COMPILE_CACHES = {}
+
+def _get_qc(device):
+
+	if device not in _QC_CONNECTIONS:
+		_QC_CONNECTIONS[device] = get_qc(device)
+	return _QC_CONNECTIONS[device]
+
+def _get_compile_cache(cache):
+
+	if isinstance(cache, CompilationCache):
+		return cache
+	if cache not in _COMPILE_CACHES:
+		_COMPILE_CACHES[cache] = CompilationCache(cache)
+	return _COMPILE_CACHES[cache]
+
+# Shot logs opened in this process, by directory
+_SHOT_LOGS = {}
+
+def _get_shot_log(log):
+
+	if isinstance(log, ShotLog):
+		return log
+	if log not in _SHOT_LOGS:
+		_SHOT_LOGS[log] = ShotLog(log)
+	return _SHOT_LOGS[log]
+
 class QClassifier(object):
 
 	"""
@@ -63,6 +166,38 @@ class QClassifier(object):
 		self.postprocessing = self.qproc_options['postprocessing']
 		self.classical_post = self.postprocessing['classical']
 
+		self.qencoder = QEncoder(self.qubits_chosen,\
+					self.qencoder_options)
+		self.qproc = QProcessor(None, self.qubits_chosen,\
+					self.qproc_options)
+
+		# Index of the data point being executed, for the shot log
+		self.sample_index = None
+
+		# Number of shots run by execute in this process
+		self.total_shots = 0
+
+	# Attributes holding training state, which workers do not need
+	_TRAINING_STATE = ['training_data', 'evaluations', 'min_loss_history',
+			   'nruns_history', 'reservoir', 'init_simplex',
+			   'final_simplex']
+
+	def worker_copy(self):
+
+		"""
+		Returns a copy of the classifier without its training state and
+		the cached circuits and preprocessed vectors of its encoder, to
+		be sent to worker processes.
+		"""
+
+		out = copy.copy(self)
+		for name in self._TRAINING_STATE:
+			out.__dict__.pop(name, None)
+		out.qencoder = copy.copy(self.qencoder)
+		out.qencoder.cache = None
+		out.qencoder.preprocessed = {}
+		return out
+
 	def circuit(self, input_vec, params):
 
 		"""
@@ -76,11 +211,7 @@ class QClassifier(object):
 		"""
 
 		self.params = params
-		self.qencoder = QEncoder(self.qubits_chosen,\
-					self.qencoder_options)
-		self.qproc = QProcessor(params, self.qubits_chosen,\
-					self.qproc_options)
-
+		self.input_vec = input_vec
 		self.qcircuit = self.qencoder.circuit(input_vec) +\
 			self.qproc.circuit(params)
 
@@ -88,7 +219,14 @@ class QClassifier(object):
 
 	# setting for executing the circuit
 	execute_options={
-		'nruns':10000
+		'nruns':10000,
+		'result_format':'shots', # 'shots', 'counts' or 'packed'
+		'backend':'qvm',	# 'qvm' or 'statevector'
+		'optimize':False,	# Optimize the circuit, see circ_opt.py
+		'device':'9q-generic-qvm',
+		'compile_cache':None,	# See compile_cache.py
+		'precision':'complex128', # or 'complex64' for the simulator
+		'shot_log':None,	# See shot_log.py
 	}
 
 	def execute(self, options=execute_options):
@@ -100,32 +238,184 @@ class QClassifier(object):
 			* data processing
 			* postprocessing
 
+		Args:
+			options: dictionary
+				Settings for the execution. Entries include
+				nruns: int
+					Number of shots.
+				result_format: string
+					Representation of the measurement
+					outcomes passed to the classical
+					postprocessing: 'shots' for the raw
+					nruns x nbits array, 'counts' for a
+					histogram of bitstrings and 'packed'
+					for bit-packed shots (see
+					postprocessing.py).
+				backend: string
+					'qvm' to compile and run the circuit on
+					the QVM, or 'statevector' to simulate it
+					locally (see simulator.py). The local
+					simulator loads the encoded state
+					directly when the encoding circuit
+					provides a fast path, and with nruns
+					set to None it returns the exact
+					distribution of the outcomes as a
+					histogram of probabilities.
+				device: string
+					Name of the quantum computer passed to
+					get_qc. Connections are reused within a
+					process.
+				compile_cache: CompilationCache or string
+					If given, compiled executables are
+					looked up in and added to this on-disk
+					cache (or a cache in this directory).
+				optimize: bool
+					Whether the circuit goes through the
+					peephole optimization of circ_opt.py
+					before compilation or simulation. The
+					gate counts before and after are kept
+					in self.optimization_report.
+				precision: string
+					Complex type of the amplitudes in the
+					local simulator, 'complex128' or
+					'complex64'. Single precision halves the
+					memory and bandwidth of the simulation;
+					see compare_precision for its effect on
+					the outputs.
+				shot_log: ShotLog or string
+					If given, the raw outcomes of every
+					execution are appended to this log (or a
+					log in this directory), indexed by
+					self.sample_index and the parameters,
+					so that other classical postprocessing
+					functions can be replayed on them with
+					ShotLog.replay.
+
 		Returns:
 			label: float
 				Value between 0 and 1 representing the output
 				of the binary classifier.
 		"""
 
-		# Set up connection
-		forest_cxn = get_qc('9q-generic-qvm')
-
 		nruns = options['nruns']
 
-		# Compile circuit
-		qnn_wrapped_circuit = self.qcircuit.wrap_in_numshots_loop(nruns)
-		qnn_native_circuit = forest_cxn.compiler.\
-				quil_to_native_quil(qnn_wrapped_circuit)
-		qnn_circuit_executable = forest_cxn.compiler.\
-				native_quil_to_executable(qnn_native_circuit)
+		if options.get('backend', 'qvm') == 'statevector':
+			return self._execute_statevector(options)
+
+		self.total_shots += nruns
+
+		with PROFILER.stage('execute', shots=nruns) as stage:
+
+			if PROFILER.enabled:
+				stage.add(gates=count_gates(self.qcircuit))
+
+			# Set up connection
+			device = options.get('device', '9q-generic-qvm')
+			with PROFILER.stage('execute.get_qc'):
+				forest_cxn = _get_qc(device)
+
+			# Optimize circuit
+			circuit = self.qcircuit
+			if options.get('optimize', False):
+				circuit = self._optimize(circuit)
+
+			# Compile circuit
+			with PROFILER.stage('execute.wrap_in_numshots_loop'):
+				qnn_wrapped_circuit =\
+					circuit.wrap_in_numshots_loop(nruns)
+			qnn_circuit_executable = self._compile(qnn_wrapped_circuit,
+					forest_cxn, device,
+					options.get('compile_cache'))
 
-		# Execute circuit
-		result = forest_cxn.run(qnn_circuit_executable)
+			# Execute circuit
+			with PROFILER.stage('execute.run', shots=nruns):
+				result = forest_cxn.run(qnn_circuit_executable)
+				if options.get('shot_log') is not None:
+					_get_shot_log(options['shot_log']).append(
+						result, self.sample_index,
+						self.params)
+				result = format_shots(result,
+					options.get('result_format', 'shots'))
 
-		# Postprocess the measurement outcomes
-		output = self.classical_post(result)
+			# Postprocess the measurement outcomes
+			with PROFILER.stage('execute.classical_post'):
+				output = self.classical_post(result)
 
 		return output
 
+	def _execute_statevector(self, options):
+
+		"""
+		Executes the classifier protocol with the local statevector
+		simulator.
+		"""
+
+		nruns = options['nruns']
+		self.total_shots += nruns or 0
+
+		with PROFILER.stage('execute.statevector', shots=nruns or 0):
+			dtype = options.get('precision', 'complex128')
+			sim = StatevectorSimulator(self.qubits_chosen, dtype)
+			state = sim.load_state(self.qencoder.states(
+				[self.input_vec], dtype))
+			circuit = self.qproc.qcircuit
+			if options.get('optimize', False):
+				circuit = self._optimize(circuit)
+			gates, measurements = parse_program(circuit)
+			state = sim.apply_gates(state, gates)
+			distribution = sim.distribution(state, measurements)[0]
+			if options.get('shot_log') is not None and\
+				nruns is not None:
+				result = sample_outcomes(distribution, nruns)
+				_get_shot_log(options['shot_log']).append(result,
+					self.sample_index, self.params)
+				result = format_shots(result,
+					options.get('result_format', 'shots'))
+			else:
+				result = sample_outcomes(distribution, nruns,
+					options.get('result_format', 'shots'))
+
+			output = self.classical_post(result)
+
+		return output
+
+	def _compile(self, circuit, forest_cxn, device, cache):
+
+		"""
+		Compiles a circuit wrapped in its numshots loop into an
+		executable, through the compilation cache if there is one.
+		"""
+
+		if cache is not None:
+			cache = _get_compile_cache(cache)
+			with PROFILER.stage('execute.compile_cache') as stage:
+				misses = cache.misses
+				executable = cache.compile(circuit, forest_cxn,
+							   device)
+				stage.add(misses=cache.misses-misses)
+			return executable
+
+		with PROFILER.stage('execute.quil_to_native_quil') as stage:
+			native_circuit = forest_cxn.compiler.\
+					quil_to_native_quil(circuit)
+			if PROFILER.enabled:
+				stage.add(native_gates=count_gates(native_circuit))
+		with PROFILER.stage('execute.native_quil_to_executable'):
+			executable = forest_cxn.compiler.\
+					native_quil_to_executable(native_circuit)
+		return executable
+
+	def _optimize(self, circuit):
+
+		"""
+		Applies the peephole optimization of circ_opt.py to a circuit.
+		"""
+
+		with PROFILER.stage('execute.optimize') as stage:
+			circuit, self.optimization_report = optimize_circuit(circuit)
+			stage.add(**self.optimization_report)
+		return circuit
+
 	# setting for testing the classifier on a testing set
 	test_options = {
 		'objective_func': crossentropy, # See training.py
@@ -152,18 +442,338 @@ class QClassifier(object):
 
 		objective_func = options['objective_func']
 
-		data_computed = []
-		for i, tuple in enumerate(data_set):
-                        input_vec = tuple[0]
-                        self.circuit(input_vec, self.params)
-                        output = self.execute()
-                        new_tuple = (input_vec, tuple[1], output)
-                        data_computed.append(new_tuple)
+		data_computed = self._compute(data_set)
 
 		out = objective_func(data_computed)
                 
 		return out
 
+	def _compute(self, data_set, indices=None):
+
+		"""
+		Executes the classifier on every point of a data set, returning
+		the list of tuples (feature, label, output). The indices of the
+		points, recorded in the shot log, are their positions in the
+		data set unless given.
+		"""
+
+		if indices is None:
+			indices = range(0, len(data_set))
+
+		# Preprocess the whole data set in one batch
+		self.qencoder.preprocess([tuple[0] for tuple in data_set])
+
+		data_computed = []
+		for i, tuple in zip(indices, data_set):
+			input_vec = tuple[0]
+			self.sample_index = int(i)
+			self.circuit(input_vec, self.params)
+			output = self.execute(self.execute_options)
+			new_tuple = (input_vec, tuple[1], output)
+			data_computed.append(new_tuple)
+		self.sample_index = None
+
+		return data_computed
+
+	def _race(self, training_data, order, objective_func, incumbent,
+		  options):
+
+		"""
+		Evaluates the objective function on growing subsets of the
+		training data, in the given order of the data points, and stops
+		as soon as the mean loss is worse than the incumbent by more than
+		options['z'] standard errors.
+
+		Returns:
+			A tuple (loss, complete) where complete tells whether
+			the whole training set was evaluated. Otherwise loss is
+			the mean loss of the evaluated subset.
+		"""
+
+		size = len(training_data)
+		nsamples = min(options['initial_size'], size)
+		data_computed = []
+		losses = []
+
+		while True:
+			indices = order[len(data_computed):nsamples]
+			subset = [training_data[i] for i in indices]
+			new_computed = self._compute(subset, indices)
+			data_computed += new_computed
+			losses += [objective_func([tuple])
+				   for tuple in new_computed]
+			self.racing_stats['samples'] += len(subset)
+
+			if nsamples >= size:
+				self.racing_stats['complete'] += 1
+				return objective_func(data_computed), True
+
+			mean = np.mean(losses)
+			stderr = np.std(losses, ddof=1)/np.sqrt(len(losses))
+			if incumbent is not None and\
+				mean - options['z']*stderr > incumbent:
+				self.racing_stats['rejected'] += 1
+				return mean, False
+
+			nsamples = min(int(np.ceil(nsamples*options['growth'])),
+				       size)
+
+	def gradient(self, data_set, params, options=test_options):
+
+		"""
+		Computes the objective function of the classifier on a data set
+		and its gradient with respect to the parameters, using exact
+		probabilities from the local statevector simulator and the
+		adjoint method (see StatevectorSimulator.adjoint_jacobian). The
+		cost is one forward and one backward sweep through the
+		processing circuit for the whole batch, independently of the
+		number of parameters.
+
+		Requires the classical postprocessing to be prob_one and the
+		objective function to provide its derivative with respect to the
+		outputs as a 'derivative' attribute, as crossentropy does. The
+		simulation uses the precision of self.execute_options.
+
+		Args:
+			data_set: list[(list,{0,1})]
+				See test.
+			params: list[float]
+				Parameters of the processor.
+			options: dictionary
+				See test.
+
+		Returns:
+			A tuple (loss, gradient).
+		"""
+
+		objective_func = options['objective_func']
+		if not hasattr(objective_func, 'derivative'):
+			raise ValueError('The objective function has no'
+					 ' derivative attribute')
+		if self.classical_post not in (prob_one, counts_prob_one):
+			raise ValueError('Adjoint gradients require prob_one'
+					 ' postprocessing')
+
+		params = np.asarray(params, dtype=float)
+		features = [tuple[0] for tuple in data_set]
+
+		dtype = self.execute_options.get('precision', 'complex128')
+		with PROFILER.stage('gradient.adjoint', samples=len(data_set)):
+			sim = StatevectorSimulator(self.qubits_chosen, dtype)
+			states = sim.load_state(self.qencoder.states(features,
+								    dtype))
+			gates, measurements = parse_program(
+				self.qproc.parametric_circuit(len(params)))
+			outputs, jacobian = sim.adjoint_jacobian(states, gates,
+				measurements, {'theta':params}, 'theta')
+
+		data_computed = [(tuple[0], tuple[1], output)
+				 for tuple, output in zip(data_set, outputs)]
+		loss = objective_func(data_computed)
+		gradient = objective_func.derivative(data_computed).dot(jacobian)
+
+		return loss, gradient
+
+	def probabilities(self, data, params=None, precision='complex128'):
+
+		"""
+		Computes the exact probability that readout bit ro[0] is 1 for
+		a batch of input vectors, simulating the whole batch at once
+		with the local statevector simulator.
+
+		Args:
+			data: list[list[float]]
+				Input vectors.
+			params: list[float]
+				Parameters of the processor, self.params if None.
+			precision: string
+				Complex type of the amplitudes, 'complex128' or
+				'complex64'.
+
+		Returns:
+			A numpy array of shape (len(data),).
+		"""
+
+		if params is None:
+			params = self.params
+
+		with PROFILER.stage('probabilities', samples=len(data)):
+			sim = StatevectorSimulator(self.qubits_chosen, precision)
+			states = sim.load_state(self.qencoder.states(data,
+								    precision))
+			gates, measurements = parse_program(
+				self.qproc.circuit(params))
+			states = sim.apply_gates(states, gates)
+			distribution = sim.distribution(states, measurements)
+
+		# Outcomes with ro[0] equal to 1 have odd indices
+		return distribution[:, 1::2].sum(axis=1)
+
+	def evaluate_batch(self, data, params_batch, max_states=2**16):
+
+		"""
+		Computes the outputs of the classifier on a set of input vectors
+		for many parameter vectors in one call, for instance the
+		vertices of a simplex or the members of an ensemble. The input
+		vectors are preprocessed once for all parameter vectors.
+
+		With the statevector backend, the encoded states are computed
+		once and the processing circuit is simulated for all pairs of
+		parameter vector and input vector as one batch, through its
+		parametric version (see QProcessor.parametric_circuit). With
+		prob_one postprocessing, the outputs are then computed from the
+		probability that ro[0] is 1 without drawing individual shots. Other
+		backends execute the circuits one by one.
+
+		Args:
+			data: list[list[float]]
+				Input vectors.
+			params_batch: numpy array
+				Parameter vectors, of shape (P, number of
+				parameters).
+			max_states: int
+				Largest number of states simulated at once.
+
+		Returns:
+			A numpy array of shape (P, len(data)).
+		"""
+
+		params_batch = np.atleast_2d(np.asarray(params_batch,
+							dtype=float))
+		options = self.execute_options
+		size = len(data)
+		out = np.empty((len(params_batch), size))
+
+		if options.get('backend', 'qvm') != 'statevector':
+			self.qencoder.preprocess(data)
+			current_params = self.params
+			for k, params in enumerate(params_batch.tolist()):
+				for i, input_vec in enumerate(data):
+					self.circuit(input_vec, params)
+					out[k, i] = self.execute(options)
+			self.params = current_params
+			return out
+
+		nruns = options['nruns']
+		dtype = options.get('precision', 'complex128')
+		sim = StatevectorSimulator(self.qubits_chosen, dtype)
+		states = self.qencoder.states(data, dtype)
+		gates, measurements = parse_program(
+			self.qproc.parametric_circuit(params_batch.shape[1]))
+		chunk = max(1, max_states//max(size, 1))
+
+		for start in range(0, len(params_batch), chunk):
+			params = params_batch[start:start+chunk]
+			with PROFILER.stage('evaluate_batch',
+					    samples=len(params)*size):
+				batch = sim.load_state(np.tile(states,
+							       (len(params), 1)))
+				batch = sim.apply_gates(batch, gates,
+					{'theta':np.repeat(params, size, axis=0)})
+				distribution = sim.distribution(batch, measurements)
+
+			if self.classical_post in (prob_one, counts_prob_one):
+				# Outcomes with ro[0] equal to 1 have odd indices
+				outputs = distribution[:, 1::2].sum(axis=1)
+				if nruns is not None:
+					outputs = np.random.binomial(nruns,
+						np.clip(outputs, 0, 1))/nruns
+			else:
+				outputs = [self.classical_post(sample_outcomes(
+					row, nruns, options.get('result_format',
+								'shots')))
+					   for row in distribution]
+			self.total_shots += (nruns or 0)*len(outputs)
+			out[start:start+len(params)] = np.reshape(outputs,
+							(len(params), size))
+
+		return out
+
+	def predict_ensemble(self, data, params_list, weights=None):
+
+		"""
+		Averages the outputs of an ensemble of trained parameter vectors
+		on a set of input vectors, evaluated together with
+		evaluate_batch.
+
+		Args:
+			data: list[list[float]]
+				Input vectors.
+			params_list: list[list[float]]
+				Parameter vectors of the members of the
+				ensemble.
+			weights: list[float]
+				Weights of the members, equal if None.
+
+		Returns:
+			A numpy array of the averaged outputs, between 0 and 1.
+		"""
+
+		outputs = self.evaluate_batch(data, params_list)
+		return np.average(outputs, axis=0, weights=weights)
+
+	def compare_precision(self, data_set, params=None,
+			      precisions=('complex64', 'complex128')):
+
+		"""
+		Reports the deviation of the prob_one outputs of the classifier
+		on a data set when it is simulated in a lower precision, with
+		respect to the last precision given.
+
+		Args:
+			data_set: list[(list,{0,1})]
+				A list of tuples (feature, label); only the
+				features are used.
+			params: list[float]
+				Parameters of the processor, self.params if None.
+			precisions: list[string]
+				Complex types compared, the reference last.
+
+		Returns:
+			A dictionary whose entry for every precision but the
+			reference holds a dictionary with
+				max_deviation: largest absolute difference of
+					the outputs
+				mean_deviation: mean absolute difference of the
+					outputs
+				label_changes: number of points whose outputs
+					lie on different sides of 0.5
+		"""
+
+		features = [tuple[0] for tuple in data_set]
+		reference = self.probabilities(features, params, precisions[-1])
+
+		report = {}
+		for precision in precisions[:-1]:
+			outputs = self.probabilities(features, params, precision)
+			deviation = np.abs(outputs.astype(np.float64) - reference)
+			report[precision] = {
+				'max_deviation':float(deviation.max()),
+				'mean_deviation':float(deviation.mean()),
+				'label_changes':int(np.count_nonzero(
+					(outputs >= 0.5) != (reference >= 0.5))),
+			}
+
+		return report
+
+	# settings for racing evaluations in train
+	RACING_OPTIONS_DEFAULT={
+		'initial_size':8,	# Data points in the first subset
+		'growth':2,		# Factor between subset sizes
+		'z':2.0,		# Standard errors needed for rejection
+		'seed':None,		# Seed of the order of the data points
+	}
+
+	# settings for scheduling the number of shots in train
+	SHOT_SCHEDULE_DEFAULT={
+		'min_nruns':500,	# Shots per execution at the start
+		'max_nruns':10000,	# Upper bound on the shots per execution
+		'growth':2,		# Factor applied to the shots
+		'tol':0.05,		# Relative improvement below which the
+					# shots grow
+		'window':3,		# Iterations over which it is measured
+	}
+
 	# settings for training the variational classifier
 	train_options={
 		'training_data':XOR_TRAINING_DATA, # Example. See xor_example.py
@@ -173,7 +783,16 @@ class QClassifier(object):
 		'maxiter':20,
 		'xatol':1e-3,
 		'fatol':1e-3,
-		'verbose':True		# Print intermediate values
+		'verbose':True,		# Print intermediate values
+		'callback':None,	# Called after every iteration
+		'checkpoint_file':None,	# File for saving the training state
+		'checkpoint_every':10,	# Number of evaluations between saves
+		'gradient':None,	# 'adjoint' for gradients from simulation
+		'nprocs':1,		# Worker processes evaluating the loss
+		'racing':None,		# See RACING_OPTIONS_DEFAULT
+		'workers':None,		# Remote workers evaluating the loss
+		'shot_schedule':None,	# See SHOT_SCHEDULE_DEFAULT
+		'init_simplex':None,	# Initial simplex for 'nelder-mead'
 	}
 
 	def train(self, options=train_options):
@@ -196,9 +815,90 @@ class QClassifier(object):
 					classifier performs on the data set.
 				training_method: string
 					Name of the method for training the
-					parameters.
+					parameters: 'nelder-mead', 'bfgs' or
+					'spsa'.
+				callback: function handle
+					Optional function called after every
+					iteration as
+						callback(niter, params, loss)
+					Training stops early, keeping the best
+					parameters found so far, if it returns
+					True.
+				checkpoint_file: string
+					If given, the training state is saved
+					to this file every checkpoint_every
+					objective evaluations and at the end.
+					If the file already exists, training
+					resumes from it: the optimizer is
+					replayed from the saved initial simplex
+					and previously evaluated points are not
+					evaluated again, except those rejected
+					by racing. Resuming with another
+					training method, init_params, training
+					set or objective function raises a
+					ValueError.
+				gradient: string
+					With 'adjoint', the 'bfgs' method uses
+					exact losses and gradients from the
+					local simulator (see gradient) instead
+					of finite differences of test.
+				nprocs: int
+					If larger than 1, the training set is
+					placed in shared memory and the loss is
+					evaluated by this many worker processes
+					(see parallel.py).
+				workers: list[(string, int)]
+					If given, the loss is evaluated by the
+					workers listening at these addresses
+					(host, port), see distributed.py. The
+					secret shared with the workers is read
+					from QCLASSIFY_SECRET.
+				racing: dictionary
+					If given, candidate parameters are
+					evaluated on growing random subsets of
+					the training data and rejected as soon
+					as their mean loss is worse than the
+					best full evaluation so far by z
+					standard errors (see
+					RACING_OPTIONS_DEFAULT). Rejected
+					points get an infinite loss, so that
+					Nelder-Mead never keeps them in the
+					simplex. The objective must then be a
+					mean of per-sample losses, as
+					crossentropy is. Counts of evaluated
+					samples, complete evaluations and
+					rejections are kept in
+					self.racing_stats. Only available with
+					'nelder-mead', and not with nprocs,
+					workers or adjoint gradients.
+				shot_schedule: dictionary
+					If given, executions start with
+					min_nruns shots, and the shots are
+					multiplied by growth, up to max_nruns,
+					whenever the best loss improved by less
+					than the fraction tol over the last
+					window iterations (see
+					SHOT_SCHEDULE_DEFAULT). The shots of
+					every iteration are kept in
+					self.nruns_history. Not available with
+					nprocs or workers.
+				init_simplex: list[list[float]]
+					Initial simplex of the 'nelder-mead'
+					method, random around init_params if
+					None. The final simplex is kept in
+					self.final_simplex.
+				spsa_options: dictionary
+					Settings of the 'spsa' training method,
+					see training.SPSA_OPTIONS_DEFAULT. With
+					a checkpoint file and no seed, a seed is
+					drawn and saved for resuming. The
+					reported losses are SPSA's estimates
+					from its two evaluations per iteration.
 				...the remaining parameters are dependent on
 				training method employed.
+
+		The number of shots run during training is kept in
+		self.training_shots.
 		"""
 
 		self.training_data = options['training_data']
@@ -211,36 +911,261 @@ class QClassifier(object):
 		training_method = self.training_method
 		init_params = self.init_params
 
+		# Fit the preprocessing to the training set
+		if not getattr(self.qencoder.preprocessor, 'fitted', True):
+			self.qencoder.fit([x[0] for x in training_data])
+
+		# Resume from an earlier checkpoint of the same training run
+		checkpoint_file = options.get('checkpoint_file')
+		checkpoint_every = options.get('checkpoint_every', 10)
+		self.init_simplex = options.get('init_simplex')
+		self.evaluations = []
+		spsa_seed = None
+		if checkpoint_file is not None:
+			fingerprint = data_fingerprint(training_data)
+			objective_name = getattr(objective_func, '__name__',
+						 repr(objective_func))
+		if checkpoint_file is not None and\
+			os.path.exists(checkpoint_file):
+			state = load_checkpoint(checkpoint_file)
+			if state['training_method'] != training_method or\
+				list(state['init_params']) != list(init_params) or\
+				state.get('training_data') != fingerprint or\
+				state.get('objective_func') != objective_name:
+				raise ValueError('Checkpoint '+checkpoint_file+
+						 ' belongs to a different'
+						 ' training run')
+			self.init_simplex = state['init_simplex']
+			self.evaluations = state['evaluations']
+			spsa_seed = state.get('spsa_seed')
+			if options['verbose'] == True:
+				print('Resuming from '+checkpoint_file+' with '+
+				      str(len(self.evaluations))+' evaluations')
+
+		# SPSA must draw the same directions when it is resumed, so its
+		# seed is fixed and saved with the checkpoint
+		if training_method == 'spsa' and checkpoint_file is not None:
+			spsa_options = dict(options.get('spsa_options',
+							SPSA_OPTIONS_DEFAULT))
+			if spsa_options['seed'] is None:
+				if spsa_seed is None:
+					spsa_seed = int(np.random.randint(0, 2**31))
+				spsa_options['seed'] = spsa_seed
+			spsa_seed = spsa_options['seed']
+			options = dict(options, spsa_options=spsa_options)
+
+		# Objective values of every point evaluated so far, by point and
+		# number of shots, so that losses estimated with fewer shots are
+		# not reused once the shot schedule has raised them. Points
+		# rejected by racing in an earlier run are evaluated again
+		evaluated = dict(((tuple(x), nruns), (loss, complete))
+				 for x, loss, nruns, complete in self.evaluations
+				 if complete)
+
+		def save():
+			save_checkpoint(checkpoint_file, {
+				'training_method':training_method,
+				'init_params':list(init_params),
+				'training_data':fingerprint,
+				'objective_func':objective_name,
+				'init_simplex':self.init_simplex,
+				'spsa_seed':spsa_seed,
+				'evaluations':self.evaluations,
+				'Nfeval':self.Nfeval,
+				'min_loss_history':self.min_loss_history,
+				'params':[float(x) for x in best['params']],
+			})
+
+		# Racing evaluation of the candidate parameters
+		racing = options.get('racing')
+		if racing is not None:
+			if options.get('workers') or options.get('nprocs', 1) > 1\
+				or options.get('gradient') == 'adjoint':
+				raise ValueError('Racing is not available with'
+						 ' nprocs, workers or adjoint'
+						 ' gradients')
+			if training_method != 'nelder-mead':
+				raise ValueError('Racing is only available with'
+						 ' nelder-mead')
+			race_order = np.random.RandomState(racing['seed']).\
+				permutation(len(training_data))
+			race_incumbent = [None]
+			self.racing_stats = {'samples':0, 'complete':0,
+					     'rejected':0}
+
+		# Gradients computed along with the objective values
+		use_gradient = options.get('gradient') == 'adjoint'
+		gradients = {}
+
 		# Wrapper for the optimization
 		def targetfunc(params):
+			nruns = self.execute_options.get('nruns')
+			key = (tuple(params), nruns)
+			if key in evaluated:
+				loss, complete = evaluated[key]
+				if racing is not None and complete and\
+					(race_incumbent[0] is None or
+					 loss < race_incumbent[0]):
+					race_incumbent[0] = loss
+				return loss if complete else np.inf
 			self.params = params
-			return self.test(training_data)
+			complete = True
+			if use_gradient:
+				loss, gradients[key[0]] = self.gradient(training_data,
+					params, {'objective_func':objective_func})
+			elif evaluator is not None:
+				loss = evaluator.test(params, objective_func)
+				remote_shots[0] += len(training_data)*\
+					(self.execute_options['nruns'] or 0)
+			elif racing is not None:
+				loss, complete = self._race(training_data,
+					race_order, objective_func,
+					race_incumbent[0], racing)
+				if complete and (race_incumbent[0] is None or
+						 loss < race_incumbent[0]):
+					race_incumbent[0] = loss
+			else:
+				loss = self.test(training_data,
+					{'objective_func':objective_func})
+			evaluated[key] = (loss, complete)
+			self.evaluations.append(([float(x) for x in params],
+						 float(loss), nruns, complete))
+			if checkpoint_file is not None and\
+				len(self.evaluations) % checkpoint_every == 0:
+				save()
+			# The mean loss of a subset is not comparable with
+			# complete losses, so a rejected point must lose
+			return loss if complete else np.inf
+
+		def jacfunc(params):
+			key = tuple(params)
+			if key not in gradients:
+				evaluated.pop((key, self.execute_options.get('nruns')),
+					      None)
+				targetfunc(params)
+			return gradients[key]
+
+		# Shot schedule, applied to a copy of the execution options
+		schedule = options.get('shot_schedule')
+		execute_options = self.execute_options
+		self.nruns_history = []
+		if schedule is not None:
+			if options.get('workers') or options.get('nprocs', 1) > 1:
+				raise ValueError('The shot schedule is not'
+						 ' available with nprocs or'
+						 ' workers')
+			self.execute_options = dict(execute_options,
+						    nruns=schedule['min_nruns'])
+			raised = [0]	# iteration of the last change
+
+		def schedule_shots():
+			history = self.min_loss_history
+			window = schedule['window']
+			nruns = self.execute_options['nruns']
+			if nruns >= schedule['max_nruns'] or\
+				len(history) - raised[0] < window+1:
+				return
+			# Only compare losses estimated with the current shots
+			level = history[raised[0]:]
+			before = min(level[:-window])
+			improvement = before - min(level)
+			if improvement < schedule['tol']*abs(before):
+				nruns = min(int(nruns*schedule['growth']),
+					    schedule['max_nruns'])
+				self.execute_options = dict(self.execute_options,
+							    nruns=nruns)
+				raised[0] = len(history)
+				if racing is not None:
+					race_incumbent[0] = None
+				if options['verbose'] == True:
+					print('Shots per execution: '+str(nruns))
+
+		# Shots run by the evaluator processes
+		remote_shots = [0]
+		shots_before = self.total_shots
 
 		# Callback function for displaying progress
 		self.Nfeval = 1
 		self.min_loss_history = []
+		best = {'loss':None, 'params':init_params}
+		user_callback = options.get('callback')
 
-		def callback_func(input_params):
-			loss = targetfunc(input_params)
+		def callback_func(input_params, loss=None):
+			# The current point has usually been evaluated already
+			if loss is None:
+				loss = targetfunc(input_params)
 			if options['verbose'] == True:
 				print(("%4d" % self.Nfeval)+("   %.3f" % loss))
 			self.Nfeval = self.Nfeval + 1
 			self.min_loss_history.append(loss)
-
-		# Other parameters for optimization
-		maxiter = options['maxiter']
-		xatol = options['xatol']
-		fatol = options['fatol']	   
+			self.nruns_history.append(self.execute_options['nruns'])
+			if schedule is not None:
+				schedule_shots()
+			if best['loss'] is None or loss < best['loss']:
+				best['loss'] = loss
+				best['params'] = np.copy(input_params)
+			if user_callback is not None and\
+				user_callback(self.Nfeval-1, input_params, loss):
+				raise _TrainingStopped()
 
 		if options['verbose'] == True:
 			top_bar = 'Iter   Obj'
 			print(top_bar)
  
+		evaluator = None
+		if options.get('workers') and not use_gradient:
+			evaluator = DistributedEvaluator(self, training_data,
+							 options['workers'])
+		elif options.get('nprocs', 1) > 1 and not use_gradient:
+			evaluator = ParallelEvaluator(self, training_data,
+						      options['nprocs'])
+
+		try:
+			res = self._minimize(targetfunc, init_params,
+					     callback_func, options,
+					     jacfunc if use_gradient else None)
+		except _TrainingStopped:
+			if options['verbose'] == True:
+				print('Training stopped by callback')
+			self.params = best['params']
+			if checkpoint_file is not None:
+				save()
+			return
+		finally:
+			if evaluator is not None:
+				evaluator.close()
+			self.execute_options = execute_options
+			self.training_shots = self.total_shots - shots_before +\
+				remote_shots[0]
+			if options['verbose'] == True:
+				print('Total shots: '+str(self.training_shots))
+
+		# Update the optimized parameters
+		self.params = res.x
+		best['params'] = res.x
+		if 'final_simplex' in res:
+			self.final_simplex = res.final_simplex[0].tolist()
+
+		if checkpoint_file is not None:
+			save()
+
+	def _minimize(self, targetfunc, init_params, callback_func, options,
+		      jacfunc=None):
+
+		"""
+		Runs the optimizer chosen by options['training_method'].
+		"""
+
+		training_method = options['training_method']
+		maxiter = options['maxiter']
+		xatol = options['xatol']
+		fatol = options['fatol']
+
 		if training_method == 'bfgs':
 
 			# Optimize the target function
 			res = minimize(targetfunc, init_params, args=(),
-                                       method='bfgs', tol=1e-2,
+                                       method='bfgs', tol=1e-2, jac=jacfunc,
                                        callback=callback_func,\
                                        options={'disp': False,
                                                 'maxiter': maxiter,
@@ -248,15 +1173,21 @@ class QClassifier(object):
                                                 'return_all': False,
                                                 'fatol': fatol})
 
-		if training_method == 'nelder-mead':
+		elif training_method == 'nelder-mead':
+
+			# Compute an initial simplex, unless it is restored
+			# from a checkpoint
+			init_simplex = self.init_simplex
+			if init_simplex is None:
+				init_simplex = [list(init_params)]
+				nparams = len(init_params)
+				for x in range(0, nparams):
+					perturbed_params = [y+uniform(-pi, pi)\
+							for y in init_params]
+					init_simplex = init_simplex +\
+						[perturbed_params]
+				self.init_simplex = init_simplex
 
-			# Compute an initial simplex
-			init_simplex = [init_params]
-			nparams = len(init_params)
-			for x in range(0, nparams):
-    				perturbed_params = [y+uniform(-pi, pi)\
-						for y in init_params]
-    				init_simplex = init_simplex + [perturbed_params]		
 			# Optimize the target function
 			res = minimize(targetfunc, init_params, args=(),
 				       method='Nelder-Mead', tol=1e-2, 
@@ -268,8 +1199,291 @@ class QClassifier(object):
 						'return_all': False,
 						'fatol': fatol})
 
-		# Update the optimized parameters
-		self.params = res.x
+		elif training_method == 'spsa':
+
+			res = spsa_minimize(targetfunc, init_params, maxiter,
+					    options.get('spsa_options',
+							SPSA_OPTIONS_DEFAULT),
+					    callback=callback_func)
+
+		else:
+			raise ValueError('Unknown training method '+
+					 str(training_method))
+
+		return res
+
+	# settings for incremental retraining
+	retrain_options={
+		'objective_func':crossentropy,	# See training.py
+		'training_method':'nelder-mead',
+		'replay_size':200,	# Old data points kept for replay
+		'step':0.1,		# Smallest size of the initial simplex
+		'maxiter':20,
+		'tol':1e-3,		# Improvement below which training stops
+		'patience':3,		# Iterations over which it is measured
+		'xatol':1e-3,
+		'fatol':1e-3,
+		'verbose':True,
+		'seed':None,		# Seed of the reservoir sampling
+	}
+
+	def retrain(self, new_data, options=retrain_options):
+
+		"""
+		Retrain the classifier when new labelled data arrive, starting
+		from the current parameters instead of init_params. The new data
+		are trained on together with a replay of old data points, kept
+		as a uniform reservoir sample of every point seen so far
+		(starting with the training set of the last call of train).
+
+		Args:
+			new_data: list[(list,{0,1})]
+				Newly arrived data points (features, label).
+			options: dictionary
+				Settings of the retraining which include
+				objective_func, training_method, maxiter,
+				xatol, fatol, verbose:
+					See train.
+				replay_size: int
+					Number of old data points replayed.
+				step: float
+					With 'nelder-mead', the final simplex of
+					the last training, moved to the current
+					parameters, is reused if its vertices
+					are at least this far apart,
+					otherwise the initial simplex has edges
+					of this length along the axes.
+				tol, patience: float, int
+					Training stops when the best loss
+					improved by less than tol over the last
+					patience iterations.
+				seed: int
+					Seed of the reservoir sampling, used
+					on the first call.
+				...further settings are passed to train.
+		"""
+
+		if not hasattr(self, 'reservoir'):
+			self.reservoir = []
+			self.nseen = 0
+			self.reservoir_rng = np.random.RandomState(
+				options.get('seed'))
+			self._add_to_reservoir(getattr(self, 'training_data', []),
+					       options['replay_size'])
+
+		params = [float(x) for x in self.params]
+
+		# Warm start of the simplex: the shape of the last final simplex
+		# moved to the current parameters, since a run stopped early by
+		# the callback does not update it
+		simplex = getattr(self, 'final_simplex', None)
+		if simplex is not None:
+			offsets = np.asarray(simplex) - simplex[0]
+			if np.max(np.abs(offsets)) < options['step']:
+				simplex = None
+			else:
+				simplex = (np.asarray(params) + offsets).tolist()
+		if simplex is None:
+			simplex = [params] + [params[:i] +
+				[params[i]+options['step']] + params[i+1:]
+				for i in range(0, len(params))]
+
+		# Stop once the loss has stabilized
+		history = []
+		user_callback = options.get('callback')
+
+		def callback(niter, input_params, loss):
+			history.append(loss)
+			patience = options['patience']
+			if len(history) > patience and min(history[:-patience])\
+				- min(history) < options['tol']:
+				return True
+			return user_callback is not None and\
+				user_callback(niter, input_params, loss)
+
+		train_options = dict(self.train_options)
+		train_options.update(options)
+		train_options.update({
+			'training_data':list(new_data) + self.reservoir,
+			'init_params':params,
+			'init_simplex':simplex,
+			'callback':callback,
+			'checkpoint_file':None,
+		})
+		self.train(train_options)
+
+		self._add_to_reservoir(new_data, options['replay_size'])
+
+	def _add_to_reservoir(self, data, size):
+
+		"""
+		Updates the reservoir sample of the data seen so far with
+		Algorithm R.
+		"""
+
+		for tuple in data:
+			self.nseen += 1
+			if len(self.reservoir) < size:
+				self.reservoir.append(tuple)
+			else:
+				k = self.reservoir_rng.randint(0, self.nseen)
+				if k < size:
+					self.reservoir[k] = tuple
+
+	# settings for multi-start training
+	train_multistart_options={
+		'training_data':XOR_TRAINING_DATA, # Example. See xor_example.py
+		'objective_func':crossentropy,	# See training.py
+		'init_params':[3.0672044712460114, 3.3311348339721203],
+		'nstarts':8,		# Number of independent optimizations
+		'spread':pi,		# Range of the random initial points
+		'maxiter':20,		# Iterations of the surviving starts
+		'round_iters':5,	# Iterations between pruning steps
+		'keep_fraction':0.5,	# Fraction of starts kept at each step
+		'nprocs':None,		# Worker processes (None for nstarts)
+		'xatol':1e-3,
+		'fatol':1e-3,
+		'verbose':True
+	}
+
+	def train_multistart(self, options=train_multistart_options):
+
+		"""
+		Train the variational quantum classifier with several Nelder-Mead
+		optimizations started from different initial points. The
+		optimizations run concurrently in rounds of a few iterations, and
+		after each round only the best fraction of them is continued.
+
+		Args:
+			options: dictionary
+				Information about the training which includes
+				training_data, objective_func, init_params:
+					See train.
+				nstarts: int
+					Number of initial points. The first one
+					is init_params and the others are drawn
+					uniformly within spread of it.
+				maxiter: int
+					Maximum number of iterations of each
+					optimization.
+				round_iters: int
+					Number of iterations run between two
+					pruning steps.
+				keep_fraction: float
+					Fraction of the optimizations which
+					survive each pruning step.
+				nprocs: int
+					Number of worker processes. The rounds
+					are run in the current process if this
+					is 1.
+
+		Returns:
+			A dictionary with entries
+			params: list[float]
+				Best parameters found, also stored in
+				self.params.
+			loss: float
+				Objective value of params.
+			trajectories: list[dictionary]
+				For every start, its init_params, the list of
+				losses of its best vertex after each iteration
+				and its status ('pruned' or 'finished').
+		"""
+
+		training_data = options['training_data']
+		objective_func = options['objective_func']
+		init_params = options['init_params']
+		nstarts = options['nstarts']
+		spread = options['spread']
+		nprocs = options['nprocs']
+		if nprocs is None:
+			nprocs = nstarts
+
+		# Fit the preprocessing to the training set
+		if not getattr(self.qencoder.preprocessor, 'fitted', True):
+			self.qencoder.fit([x[0] for x in training_data])
+
+		# Initial points and simplices, built as in train
+		starts = []
+		for k in range(0, nstarts):
+			if k == 0:
+				x0 = list(init_params)
+			else:
+				x0 = [y+uniform(-spread, spread) for y in init_params]
+			simplex = [x0] + [[y+uniform(-pi, pi) for y in x0]
+					  for x in range(0, len(x0))]
+			starts.append({'init_params':x0, 'simplex':simplex,
+				       'values':[], 'losses':[],
+				       'status':'running'})
+
+		if nprocs == 1:
+			_multistart_init(self, training_data, objective_func)
+			pool = None
+			map_func = map
+		else:
+			pool = multiprocessing.Pool(nprocs,
+					initializer=_multistart_init,
+					initargs=(self.worker_copy(),
+						  training_data,
+						  objective_func))
+			map_func = pool.map
+
+		if options['verbose'] == True:
+			print('Iter   Starts   Obj')
+
+		try:
+			niter = 0
+			running = starts
+			while running and niter < options['maxiter']:
+				round_iters = min(options['round_iters'],
+						  options['maxiter']-niter)
+				results = list(map_func(_multistart_segment,
+					[(start['simplex'], start['values'],
+					  round_iters, options['xatol'],
+					  options['fatol']) for start in running]))
+				niter = niter + round_iters
+
+				for start, result in zip(running, results):
+					vertices, values, losses, converged = result
+					start['simplex'] = [list(x) for x in vertices]
+					start['values'] = list(values)
+					start['losses'] += losses
+					if converged:
+						start['status'] = 'finished'
+
+				running = [start for start in running
+					   if start['status'] == 'running']
+				running.sort(key=lambda start: start['values'][0])
+				nkeep = max(1, int(np.ceil(
+					options['keep_fraction']*len(running))))
+				for start in running[nkeep:]:
+					start['status'] = 'pruned'
+				running = running[:nkeep]
+
+				if options['verbose'] == True:
+					best = min(start['values'][0]
+						   for start in starts)
+					print(("%4d" % niter)+("   %6d" % len(running))+
+					      ("   %.3f" % best))
+		finally:
+			if pool is not None:
+				pool.terminate()
+
+		for start in running:
+			start['status'] = 'finished'
+
+		best = min(starts, key=lambda start: start['values'][0])
+		self.params = np.asarray(best['simplex'][0])
+		self.min_loss_history = best['losses']
+
+		return {
+			'params':self.params,
+			'loss':best['values'][0],
+			'trajectories':[{'init_params':start['init_params'],
+					 'losses':start['losses'],
+					 'status':start['status']}
+					for start in starts],
+		}
 
 	# setting for plotting decision boundary of the classifier for a chosen
 	# pair of features (limited to 2D plots)
@@ -278,7 +1492,10 @@ class QClassifier(object):
 		'xmin':-pi,	# boundary
 		'xmax':pi,
 		'ymin':-pi/2,
-		'ymax':3*pi/2
+		'ymax':3*pi/2,
+		'adaptive':False,	# quadtree refinement, see adaptive_mesh.py
+		'max_depth':3,		# levels of refinement of the grid
+		'tol':0.1,		# refine cells whose outputs differ more
 	}
 
 	def plot_decision_boundary(self, input_vec, features_chosen,\
@@ -305,6 +1522,22 @@ class QClassifier(object):
 					for generating the plot.
 				xmin, xmax, ymin, ymax: float
 					Range of the plot along each axis.
+				adaptive: bool
+					If True, the nmesh x nmesh grid is only
+					a coarse grid whose cells are refined
+					where the output crosses 0.5 or changes
+					by more than tol, up to max_depth times
+					(see adaptive_mesh.py).
+				max_depth: int
+					Levels of refinement in adaptive mode.
+				tol: float
+					Change of the output across a cell above
+					which it is refined in adaptive mode.
+
+		Returns:
+			In adaptive mode, the dictionary returned by
+			refine_quadtree, holding the sampled points, the
+			outputs and the interpolated field. None otherwise.
 		"""
 
 		nmesh = options['nmesh']
@@ -313,25 +1546,31 @@ class QClassifier(object):
 		ymin = options['ymin']
 		ymax = options['ymax']
 
-		rangex = np.linspace(xmin, xmax, nmesh)
-		rangey = np.linspace(ymin, ymax, nmesh)
-
-		range_inputs = []
-		func_vals = []
-
-		for y in rangey:
-			for x in rangex:
-				range_inputs = range_inputs + [[x,y]]
+		def func(points):
+			vals = []
+			for x, y in points:
 				input_vec[features_chosen[0]] = x
 				input_vec[features_chosen[1]] = y
 				self.circuit(input_vec, self.params)
-				func_vals = func_vals + [self.execute()]
+				vals.append(self.execute(self.execute_options))
+			return np.array(vals)
+
+		mesh = None
+		if options.get('adaptive', False):
+			mesh = refine_quadtree(func, xmin, xmax, ymin, ymax,
+					       nmesh, options.get('max_depth', 3),
+					       0.5, options.get('tol', 0.1))
+			X, Y = np.meshgrid(mesh['x'], mesh['y'])
+			Z = mesh['field']
+		else:
+			rangex = np.linspace(xmin, xmax, nmesh)
+			rangey = np.linspace(ymin, ymax, nmesh)
+			X, Y = np.meshgrid(rangex, rangey)
+			Z = np.reshape(func(np.column_stack([X.ravel(),
+							     Y.ravel()])),
+				       [nmesh, nmesh])
 
 		# Plot the decision boundaries
-		x = list(np.kron(rangey, [1 for i in range(0, nmesh)]))
-		X, Y = np.meshgrid(rangex, rangey)
-		Z = np.reshape(func_vals, [nmesh, nmesh])
-
 		levels = np.arange(-3.5, 3.5, 0.1)
 		norm = cm.colors.Normalize(vmax=abs(Z).max(),\
 					vmin=-abs(Z).max())
@@ -357,4 +1596,6 @@ class QClassifier(object):
 
 		plt.savefig(filename)
 		plt.show()
+
+		return mesh
 		
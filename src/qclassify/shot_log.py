@@ -0,0 +1,227 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+On-disk log of raw measurement outcomes, for applying other classical
+postprocessing functions later without running the circuits again.
+
+A log is a directory holding two append-only files:
+	shots.bin	the outcomes of every execution, bit-packed along the
+			shot axis as in postprocessing.PackedShots
+	index.bin	one fixed-size record per execution with the index of
+			the data point, a hash of the parameters, and the
+			offset, number of shots and number of bits of its
+			outcomes in shots.bin
+Both files are memory-mapped for reading. Appends from several processes are
+serialized with a file lock.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+try:
+	import fcntl
+except ImportError:	# not available on Windows
+	fcntl = None
+
+from qclassify.postprocessing import PackedShots, format_shots
+
+# Layout of the records of index.bin
+INDEX_DTYPE = np.dtype([
+	('sample', '<i8'),	# index of the data point, -1 if unknown
+	('params', '<u8'),	# see param_hash
+	('offset', '<u8'),	# position of the outcomes in shots.bin
+	('nshots', '<u4'),
+	('nbits', '<u4'),
+])
+
+def param_hash(params):
+
+	"""
+	64-bit hash of a parameter vector, as stored in the log.
+	"""
+
+	data = np.asarray(params, dtype='<f8').tobytes()
+	digest = hashlib.blake2b(data, digest_size=8).digest()
+	return int.from_bytes(digest, 'little')
+
+class ShotLog(object):
+
+	"""
+	Append-only memory-mapped log of bit-packed measurement outcomes.
+	"""
+
+	def __init__(self, directory):
+
+		"""
+		Args:
+			directory: string
+				Directory holding the log. It is created if
+				needed, and an existing log is appended to.
+		"""
+
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		self.data_path = os.path.join(directory, 'shots.bin')
+		self.index_path = os.path.join(directory, 'index.bin')
+		for path in (self.data_path, self.index_path):
+			open(path, 'ab').close()
+
+	def append(self, qubit_outcome, sample=None, params=None):
+
+		"""
+		Adds the outcomes of one execution to the log.
+
+		Args:
+			qubit_outcome: list[list[{0,1}]]
+				Outcomes of repeated measurement, one row per
+				shot.
+			sample: int
+				Index of the data point, None if unknown.
+			params: list[float]
+				Parameters of the processor.
+		"""
+
+		packed = format_shots(qubit_outcome, 'packed')
+		record = np.zeros(1, dtype=INDEX_DTYPE)
+		record['sample'] = -1 if sample is None else sample
+		record['params'] = 0 if params is None else param_hash(params)
+		record['nshots'] = packed.nshots
+		record['nbits'] = packed.nbits
+
+		with open(self.data_path, 'ab') as data,\
+			open(self.index_path, 'ab') as index:
+			if fcntl is not None:
+				fcntl.flock(index, fcntl.LOCK_EX)
+			data.seek(0, os.SEEK_END)
+			record['offset'] = data.tell()
+			data.write(np.ascontiguousarray(packed.data).tobytes())
+			data.flush()
+			index.write(record.tobytes())
+
+	def index(self):
+
+		"""
+		Returns the records of the log as a memory-mapped structured
+		array with the fields of INDEX_DTYPE.
+		"""
+
+		nrecords = os.path.getsize(self.index_path)//INDEX_DTYPE.itemsize
+		if nrecords == 0:
+			return np.zeros(0, dtype=INDEX_DTYPE)
+		return np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r',
+				 shape=(nrecords,))
+
+	def _data(self):
+		if os.path.getsize(self.data_path) == 0:
+			return np.zeros(0, dtype=np.uint8)
+		return np.memmap(self.data_path, dtype=np.uint8, mode='r')
+
+	def __len__(self):
+		return len(self.index())
+
+	def select(self, sample=None, params=None):
+
+		"""
+		Returns the numbers of the records matching a data point and a
+		parameter vector, in the order they were logged.
+
+		Args:
+			sample: int
+				Index of the data point, None for any.
+			params: list[float]
+				Parameters of the processor, None for any.
+		"""
+
+		index = self.index()
+		mask = np.ones(len(index), dtype=bool)
+		if sample is not None:
+			mask &= index['sample'] == sample
+		if params is not None:
+			mask &= index['params'] == param_hash(params)
+		return np.nonzero(mask)[0]
+
+	def shots(self, record):
+
+		"""
+		Returns the outcomes of a record as a PackedShots object.
+		"""
+
+		entry = self.index()[record]
+		nbits = int(entry['nbits'])
+		nbytes = (int(entry['nshots'])+7)//8
+		start = int(entry['offset'])
+		data = self._data()[start:start+nbytes*nbits]
+		return PackedShots(np.array(data).reshape(nbytes, nbits),
+				   int(entry['nshots']))
+
+	def replay(self, func, records=None, result_format='packed', **kwargs):
+
+		"""
+		Applies a classical postprocessing function to logged outcomes.
+
+		Records with the same number of shots and bits are gathered
+		into one array and processed at once if the function provides
+		a vectorized 'batch' version (see postprocessing.py). Otherwise
+		the function is called on every record.
+
+		Args:
+			func: function
+				Classical postprocessing function, such as
+				prob_one.
+			records: list[int]
+				Numbers of the records, for instance from
+				select. All records if None.
+			result_format: string
+				Representation passed to func, see
+				postprocessing.format_shots.
+			kwargs:
+				Further arguments of func.
+
+		Returns:
+			A numpy array with the value of func for every record.
+		"""
+
+		index = self.index()
+		if records is None:
+			records = np.arange(len(index))
+		records = np.asarray(records, dtype=np.int64)
+		out = np.empty(len(records))
+
+		if not hasattr(func, 'batch'):
+			for k, record in enumerate(records):
+				result = self.shots(record)
+				if result_format != 'packed':
+					result = format_shots(result.unpack(),
+							      result_format)
+				out[k] = func(result, **kwargs)
+			return out
+
+		data = self._data()
+		entries = index[records]
+		shapes = np.stack([entries['nshots'], entries['nbits']], axis=1)
+		for nshots, nbits in np.unique(shapes, axis=0):
+			group = np.nonzero((shapes[:, 0] == nshots) &
+					   (shapes[:, 1] == nbits))[0]
+			size = ((int(nshots)+7)//8)*int(nbits)
+			positions = entries['offset'][group].astype(np.int64)
+			batch = data[positions[:, None] + np.arange(size)]
+			batch = batch.reshape(len(group), -1, int(nbits))
+			out[group] = func.batch(batch, int(nshots), **kwargs)
+		return out
@@ -0,0 +1,395 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Local statevector simulation of pyquil Programs with numpy.
+
+A simulator acts on a fixed list of qubits. States are numpy arrays of shape
+(batch, 2, 2, ..., 2) holding a batch of statevectors, with axis k+1
+corresponding to qubits[k]. Flattened statevectors of length 2^n therefore
+have qubits[0] as their most significant bit.
+
+Gate parameters may be numbers or references to classical memory, such as
+theta[i] for a region declared with Program.declare('theta', 'REAL', n).
+Their values are passed in a memory dictionary, with either one value per
+region entry or one row of values per state of the batch.
+"""
+
+import numpy as np
+
+from pyquil.quilatom import MemoryReference
+from pyquil.quilbase import Gate, Measurement
+
+def _rx(theta):
+	c, s = np.cos(theta/2), np.sin(theta/2)
+	return np.array([[c, -1j*s], [-1j*s, c]])
+
+def _ry(theta):
+	c, s = np.cos(theta/2), np.sin(theta/2)
+	return np.array([[c, -s], [s, c]])
+
+def _rz(theta):
+	z = np.zeros_like(theta)
+	return np.array([[np.exp(-0.5j*theta), z], [z, np.exp(0.5j*theta)]])
+
+def _phase(theta):
+	o, z = np.ones_like(theta), np.zeros_like(theta)
+	return np.array([[o, z], [z, np.exp(1j*theta)]])
+
+def _dphase(theta):
+	z = np.zeros_like(theta)
+	return np.array([[z, z], [z, 1j*np.exp(1j*theta)]])
+
+# Constant gates
+GATES = {
+	'I': np.eye(2),
+	'X': np.array([[0, 1], [1, 0]]),
+	'Y': np.array([[0, -1j], [1j, 0]]),
+	'Z': np.diag([1, -1]),
+	'H': np.array([[1, 1], [1, -1]])/np.sqrt(2),
+	'S': np.diag([1, 1j]),
+	'T': np.diag([1, np.exp(0.25j*np.pi)]),
+	'CZ': np.diag([1, 1, 1, -1]),
+	'CNOT': np.array([[1, 0, 0, 0], [0, 1, 0, 0],
+			  [0, 0, 0, 1], [0, 0, 1, 0]]),
+	'SWAP': np.array([[1, 0, 0, 0], [0, 0, 1, 0],
+			  [0, 1, 0, 0], [0, 0, 0, 1]]),
+}
+
+# Gates with one angle, as functions returning their matrix. The matrices of
+# a batch of angles have the batch as their last axis.
+PARAMETRIC_GATES = {
+	'RX': _rx,
+	'RY': _ry,
+	'RZ': _rz,
+	'PHASE': _phase,
+}
+
+# Derivatives of the parametric gates with respect to their angle
+PARAMETRIC_GATE_DERIVATIVES = {
+	'RX': lambda theta: 0.5*_rx(theta + np.pi),
+	'RY': lambda theta: 0.5*_ry(theta + np.pi),
+	'RZ': lambda theta: 0.5*_rz(theta + np.pi),
+	'PHASE': _dphase,
+}
+
+def _dagger(mat):
+	if mat.ndim == 2:
+		return mat.conj().T
+	return mat.conj().transpose(1, 0, 2)
+
+def parse_program(program):
+
+	"""
+	Extracts the gates and measurements of a pyquil Program.
+
+	Returns:
+		A tuple (gates, measurements) where gates is a list of tuples
+		(name, params, qubits) with qubits a list of qubit indices, and
+		measurements is a list of tuples (qubit, readout offset).
+	"""
+
+	gates = []
+	measurements = []
+	for instr in program.instructions:
+		if isinstance(instr, Gate):
+			if instr.modifiers:
+				raise ValueError('Gate modifiers are not supported'
+						 ' by the simulator: '+str(instr))
+			gates.append((instr.name, list(instr.params),
+				      [q.index for q in instr.qubits]))
+		elif isinstance(instr, Measurement):
+			if instr.classical_reg is not None:
+				measurements.append((instr.qubit.index,
+						     instr.classical_reg.offset))
+	return gates, measurements
+
+class StatevectorSimulator(object):
+
+	"""
+	Statevector simulator for batches of states on a fixed list of qubits.
+	"""
+
+	def __init__(self, qubits, dtype=np.complex128):
+
+		"""
+		Args:
+			qubits: list[int]
+				Indices of the simulated qubits.
+			dtype: numpy dtype
+				Complex type of the amplitudes.
+		"""
+
+		self.qubits = list(qubits)
+		self.nqubits = len(self.qubits)
+		self.dtype = np.dtype(dtype)
+		self.axes = dict((q, k+1) for k, q in enumerate(self.qubits))
+
+	def zero_state(self, batch=1):
+
+		"""
+		Returns a batch of copies of the state |0...0>.
+		"""
+
+		state = np.zeros((batch,)+(2,)*self.nqubits, dtype=self.dtype)
+		state[(slice(None),)+(0,)*self.nqubits] = 1
+		return state
+
+	def load_state(self, amplitudes):
+
+		"""
+		Converts flattened statevectors, of shape (2^n,) or (batch, 2^n),
+		into a batch of states.
+		"""
+
+		amplitudes = np.asarray(amplitudes, dtype=self.dtype)
+		return amplitudes.reshape((-1,)+(2,)*self.nqubits)
+
+	def flatten(self, state):
+
+		"""
+		Converts a batch of states into an array of shape (batch, 2^n).
+		"""
+
+		return state.reshape(state.shape[0], -1)
+
+	def resolve(self, param, memory):
+
+		"""
+		Value of a gate parameter: a number, or an array with one value
+		per state of the batch.
+		"""
+
+		if isinstance(param, MemoryReference):
+			values = np.asarray(memory[param.name])
+			return values[..., param.offset]
+		if isinstance(param, (int, float, complex, np.number)):
+			return float(np.real(param))
+		raise ValueError('Unsupported gate parameter: '+str(param))
+
+	def matrix(self, name, params, memory=None):
+
+		"""
+		Matrix of a gate, with the batch as the last axis if its
+		parameter differs between the states of the batch.
+		"""
+
+		if name in PARAMETRIC_GATES:
+			return PARAMETRIC_GATES[name](
+				np.asarray(self.resolve(params[0], memory)))
+		if name in GATES:
+			return GATES[name]
+		raise ValueError('Gate '+name+' is not supported by the'
+				 ' simulator')
+
+	def apply_matrix(self, state, mat, qubits):
+
+		"""
+		Applies a one or two-qubit gate matrix to a batch of states.
+
+		Args:
+			state: numpy array
+				Batch of states.
+			mat: numpy array
+				Matrix of shape (d, d), or (d, d, batch) for a
+				different matrix on every state.
+			qubits: list[int]
+				Qubits the gate acts on.
+		"""
+
+		axes = [self.axes[q] for q in qubits]
+		ndim = state.ndim
+		dim = 2**len(axes)
+		mat = np.asarray(mat, dtype=self.dtype)
+
+		state = np.moveaxis(state, axes, range(ndim-len(axes), ndim))
+		shape = state.shape
+		state = state.reshape(shape[0], -1, dim)
+		if mat.ndim == 2:
+			state = state.dot(mat.T)
+		else:
+			state = np.einsum('bkj,ijb->bki', state, mat)
+		state = state.reshape(shape)
+		return np.moveaxis(state, range(ndim-len(axes), ndim), axes)
+
+	def apply_program(self, state, program, memory=None):
+
+		"""
+		Applies the gates of a pyquil Program to a batch of states.
+		Measurements and other non-gate instructions are ignored.
+
+		Args:
+			state: numpy array
+				Batch of states.
+			program: pyquil Program
+				Circuit to be simulated.
+			memory: dictionary
+				Values of the classical memory regions referred
+				to by gate parameters.
+		"""
+
+		gates, measurements = parse_program(program)
+		return self.apply_gates(state, gates, memory)
+
+	def apply_gates(self, state, gates, memory=None):
+
+		"""
+		Applies gates, as returned by parse_program, to a batch of
+		states.
+		"""
+
+		for name, params, qubits in gates:
+			state = self.apply_matrix(state,
+				self.matrix(name, params, memory), qubits)
+		return state
+
+	def adjoint_jacobian(self, state, gates, measurements, memory, region):
+
+		"""
+		Computes the probability that readout bit ro[0] is 1 after
+		applying gates to a batch of states, together with its
+		derivatives with respect to the entries of a classical memory
+		region, with the adjoint method: one forward sweep through the
+		gates and one backward sweep, whatever the number of
+		parameters.
+
+		Args:
+			state: numpy array
+				Batch of initial states.
+			gates: list
+				Gates as returned by parse_program. Parametric
+				gates may refer to the region as region[i].
+			measurements: list[(int, int)]
+				Measurements as returned by parse_program.
+			memory: dictionary
+				Values of the classical memory regions.
+			region: string
+				Name of the region differentiated against.
+
+		Returns:
+			A tuple (outputs, jacobian) of arrays of shapes (batch,)
+			and (batch, size of the region).
+		"""
+
+		qubit = [q for q, offset in measurements if offset == 0][0]
+		nparams = np.shape(memory[region])[-1]
+
+		# Forward sweep
+		matrices = [np.asarray(self.matrix(name, params, memory),
+				       dtype=self.dtype)
+			    for name, params, qubits in gates]
+		for mat, (name, params, qubits) in zip(matrices, gates):
+			state = self.apply_matrix(state, mat, qubits)
+
+		# Projector onto |1> of the measured qubit applied to the state
+		index = [slice(None)]*state.ndim
+		index[self.axes[qubit]] = 0
+		adjoint = state.copy()
+		adjoint[tuple(index)] = 0
+
+		batch = state.shape[0]
+		axes = tuple(range(1, state.ndim))
+		outputs = np.real(np.sum(np.conj(adjoint)*state, axis=axes))
+		jacobian = np.zeros((batch, nparams))
+
+		# Backward sweep
+		for mat, (name, params, qubits) in reversed(list(zip(matrices,
+								     gates))):
+			state = self.apply_matrix(state, _dagger(mat), qubits)
+			if name in PARAMETRIC_GATE_DERIVATIVES and\
+				isinstance(params[0], MemoryReference) and\
+				params[0].name == region:
+				dmat = PARAMETRIC_GATE_DERIVATIVES[name](np.asarray(
+					self.resolve(params[0], memory)))
+				dstate = self.apply_matrix(state, dmat, qubits)
+				jacobian[:, params[0].offset] += 2*np.real(np.sum(
+					np.conj(adjoint)*dstate, axis=axes))
+			adjoint = self.apply_matrix(adjoint, _dagger(mat), qubits)
+
+		return outputs, jacobian
+
+	def distribution(self, state, measurements):
+
+		"""
+		Probability distribution of the measured readout bits.
+
+		Args:
+			state: numpy array
+				Batch of states.
+			measurements: list[(int, int)]
+				Pairs (qubit, readout offset), see
+				parse_program.
+
+		Returns:
+			An array of shape (batch, 2^m) whose entry j is the
+			probability of the outcome in which readout bit ro[k]
+			equals the k-th bit of j.
+		"""
+
+		probs = np.abs(state)**2
+		measured = sorted(measurements, key=lambda m: m[1])
+		axes = [self.axes[q] for q, offset in measured]
+		others = tuple(a for a in range(1, state.ndim) if a not in axes)
+		probs = probs.sum(axis=others)
+		# remaining axes are in increasing order; put ro[m-1] first
+		order = sorted(range(len(axes)), key=lambda k: axes[k])
+		probs = np.transpose(probs, [0] + [1+order.index(k) for k in
+						  reversed(range(len(axes)))])
+		return probs.reshape(probs.shape[0], -1)
+
+def sample_outcomes(distribution, nruns, result_format='shots', rng=np.random):
+
+	"""
+	Draws measurement outcomes from a distribution of readout bits.
+
+	Args:
+		distribution: numpy array
+			Probabilities of the 2^m outcomes, see
+			StatevectorSimulator.distribution.
+		nruns: int
+			Number of shots. If None, the exact distribution is
+			returned as a histogram of probabilities.
+		result_format: string
+			'shots', 'counts' or 'packed', see
+			postprocessing.format_shots.
+		rng: numpy RandomState
+			Source of randomness.
+
+	Returns:
+		The outcomes in the chosen format. Exact distributions are always
+		returned as histograms.
+	"""
+
+	from qclassify.postprocessing import format_shots
+
+	distribution = np.asarray(distribution, dtype=np.float64)
+	nbits = int(np.log2(len(distribution)))
+
+	if nruns is None:
+		outcomes = np.nonzero(distribution)[0]
+		return dict(zip(outcomes.tolist(),
+				distribution[outcomes].tolist()))
+
+	counts = rng.multinomial(nruns, distribution/distribution.sum())
+	outcomes = np.nonzero(counts)[0]
+	if result_format == 'counts':
+		return dict(zip(outcomes.tolist(), counts[outcomes].tolist()))
+
+	shots = np.repeat(outcomes, counts[outcomes])
+	rng.shuffle(shots)
+	shots = (shots[:, None] >> np.arange(nbits)) & 1
+	return format_shots(shots, result_format)
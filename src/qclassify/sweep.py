@@ -0,0 +1,382 @@
+
+##############################################################################
+# Copyright 2018 Yudong Cao and Zapata Computing, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##############################################################################
+
+"""
+Hyperparameter sweeps over the settings of the quantum classifier.
+
+A search space is a dictionary mapping option paths to lists of candidate
+values. A path is a dot-separated sequence of keys into the configuration
+
+	{
+		'encoder_options': ...,	# see QClassifier.QCLASSIFIER_OPTIONS_DEFAULT
+		'proc_options': ...,
+		'train_options': ...,	# see QClassifier.train_options
+		'execute_options': ...,	# see QClassifier.execute_options
+	}
+
+For example
+
+	{
+		'proc_options.proc_circ_options.nlayers': [1, 2, 3],
+		'proc_options.proc_circ_options.dist': [1, 2],
+		'train_options.training_method': ['nelder-mead', 'bfgs'],
+		'execute_options.nruns': [1000, 10000],
+	}
+"""
+
+import csv
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+
+from qclassify.qclassifier import QClassifier
+
+def default_config():
+
+	"""
+	Returns a copy of the default configuration of the quantum classifier,
+	in the layout expected by the option paths of a search space.
+	"""
+
+	config = dict(QClassifier.QCLASSIFIER_OPTIONS_DEFAULT)
+	config['train_options'] = dict(QClassifier.train_options)
+	config['train_options']['verbose'] = False
+	config['execute_options'] = dict(QClassifier.execute_options)
+	return config
+
+def set_option(config, path, value):
+
+	"""
+	Returns a copy of config in which the entry at the given option path is
+	replaced by value. Only the dictionaries along the path are copied.
+
+	Args:
+		config: dictionary
+			Configuration, see default_config.
+		path: string
+			Dot-separated sequence of keys.
+		value: any
+			New value of the entry.
+	"""
+
+	keys = path.split('.')
+	out = dict(config)
+	node = out
+	for key in keys[:-1]:
+		node[key] = dict(node[key])
+		node = node[key]
+	node[keys[-1]] = value
+	return out
+
+def grid_search_space(space):
+
+	"""
+	Enumerates every combination of the candidate values in a search space.
+
+	Args:
+		space: dictionary
+			Maps option paths to lists of candidate values.
+
+	Returns:
+		A list of dictionaries mapping option paths to values.
+	"""
+
+	paths = list(space.keys())
+	return [dict(zip(paths, values)) for values in\
+		itertools.product(*[space[path] for path in paths])]
+
+def random_search_space(space, ntrials, seed=None):
+
+	"""
+	Draws random combinations of candidate values from a search space.
+
+	Args:
+		space: dictionary
+			Maps option paths to lists of candidate values, or to
+			functions which take a numpy RandomState and return a
+			value (for sampling continuous ranges).
+		ntrials: int
+			Number of combinations to draw.
+		seed: int
+			Seed of the random number generator.
+
+	Returns:
+		A list of dictionaries mapping option paths to values.
+	"""
+
+	rng = np.random.RandomState(seed)
+	out = []
+	for i in range(0, ntrials):
+		assignment = {}
+		for path, candidates in space.items():
+			if callable(candidates):
+				assignment[path] = candidates(rng)
+			else:
+				index = rng.randint(len(candidates))
+				assignment[path] = candidates[index]
+		out.append(assignment)
+	return out
+
+class MedianPruner(object):
+
+	"""
+	Early termination rule for sweep trials. A trial is stopped when its
+	best loss after a given number of iterations is worse than the chosen
+	quantile of the best losses other trials reported at that iteration.
+	"""
+
+	def __init__(self, reports, lock, prune_after=5, min_trials=4,
+	             quantile=0.5):
+
+		"""
+		Args:
+			reports: dictionary
+				Maps an iteration number to the list of best
+				losses reported at that iteration. May be a
+				multiprocessing.Manager dictionary shared
+				between worker processes.
+			lock: lock
+				Lock guarding the updates of reports.
+			prune_after: int
+				First iteration at which trials may be pruned.
+			min_trials: int
+				Minimum number of reports at an iteration
+				before the rule is applied.
+			quantile: float
+				Trials above this quantile are pruned.
+		"""
+
+		self.reports = reports
+		self.lock = lock
+		self.prune_after = prune_after
+		self.min_trials = min_trials
+		self.quantile = quantile
+
+	def report(self, niter, loss):
+
+		"""
+		Records the best loss of a trial and returns True if the trial
+		should be stopped.
+		"""
+
+		with self.lock:
+			previous = self.reports.get(niter, [])
+			self.reports[niter] = previous + [loss]
+
+		if niter < self.prune_after or len(previous) < self.min_trials:
+			return False
+		return loss > np.quantile(previous, self.quantile)
+
+class _NullLock(object):
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+# State of a sweep worker process, shared between the trials it runs
+_WORKER = {}
+
+def _init_worker(training_data, pruner, seed):
+
+	_WORKER['training_data'] = training_data
+	_WORKER['pruner'] = pruner
+	_WORKER['encoding_cache'] = {}
+	if seed is None:
+		np.random.seed()
+
+def _run_trial(args):
+
+	trial, qubits_chosen, config, assignment, seed = args
+
+	if seed is not None:
+		np.random.seed(seed + trial)
+
+	row = {'trial':trial}
+	row.update(assignment)
+
+	train_options = dict(config['train_options'])
+	train_options['training_data'] = _WORKER['training_data']
+	pruner = _WORKER['pruner']
+	state = {'best':None, 'niter':0, 'pruned':False}
+
+	def callback(niter, params, loss):
+		if state['best'] is None or loss < state['best']:
+			state['best'] = loss
+		state['niter'] = niter
+		if pruner is not None and pruner.report(niter, state['best']):
+			state['pruned'] = True
+		return state['pruned']
+
+	train_options['callback'] = callback
+
+	start = time.time()
+	try:
+		qc = QClassifier(qubits_chosen, config)
+		qc.execute_options = config['execute_options']
+		qc.qencoder.cache = _WORKER['encoding_cache']
+		qc.train(train_options)
+	except Exception as error:
+		row.update({'status':'failed', 'loss':state['best'],
+		            'niter':state['niter'], 'params':None,
+		            'time':time.time()-start, 'error':repr(error)})
+		return row
+
+	row.update({'status':'pruned' if state['pruned'] else 'completed',
+	            'loss':state['best'], 'niter':state['niter'],
+	            'params':[float(x) for x in qc.params],
+	            'time':time.time()-start})
+	return row
+
+# default settings for running a sweep
+SWEEP_OPTIONS_DEFAULT = {
+	'base_config':None,	# None for default_config()
+	'training_data':None,	# None for the data in train_options
+	'nprocs':None,		# None for the number of CPUs
+	'prune':True,		# Stop poor trials early, see MedianPruner
+	'prune_after':5,
+	'prune_min_trials':4,
+	'prune_quantile':0.5,
+	'seed':None,		# Seed for the initial simplices
+	'results_file':None,	# CSV file for the results table
+	'verbose':True,
+}
+
+def run_sweep(qubits_chosen, assignments, options=SWEEP_OPTIONS_DEFAULT):
+
+	"""
+	Trains one quantum classifier per assignment of options, distributing
+	the trials over a pool of worker processes. The training data is sent to
+	each worker once and every worker keeps a cache of encoding circuits
+	which is reused by all the trials it runs.
+
+	Args:
+		qubits_chosen: list[int]
+			List of indices for the qubits that the classifiers act
+			on.
+		assignments: list[dictionary]
+			Option paths and values of each trial, for instance from
+			grid_search_space or random_search_space.
+		options: dictionary
+			Settings of the sweep, see SWEEP_OPTIONS_DEFAULT.
+			Entries include
+			nprocs: int
+				Number of worker processes. Trials are run in
+				the current process if this is 1.
+			prune: bool
+				Whether trials are stopped early by a
+				MedianPruner with parameters prune_after,
+				prune_min_trials and prune_quantile.
+			results_file: string
+				If given, the results table is also written to
+				this CSV file.
+
+	Returns:
+		The results table, as a list of dictionaries (one per trial,
+		ordered by loss) with the option values of the trial and the
+		entries status ('completed', 'pruned' or 'failed'), loss, niter,
+		params and time.
+	"""
+
+	base = options['base_config']
+	if base is None:
+		base = default_config()
+	training_data = options['training_data']
+	if training_data is None:
+		training_data = base['train_options']['training_data']
+	nprocs = options['nprocs']
+	if nprocs is None:
+		nprocs = multiprocessing.cpu_count()
+
+	tasks = []
+	for trial, assignment in enumerate(assignments):
+		config = base
+		for path, value in assignment.items():
+			config = set_option(config, path, value)
+		tasks.append((trial, qubits_chosen, config, assignment,
+		              options['seed']))
+
+	def make_pruner(reports, lock):
+		if not options['prune']:
+			return None
+		return MedianPruner(reports, lock, options['prune_after'],
+		                    options['prune_min_trials'],
+		                    options['prune_quantile'])
+
+	rows = []
+
+	def collect(row):
+		rows.append(row)
+		if options['verbose']:
+			print('trial %4d  %-9s  loss %s  (%d/%d)' %
+			      (row['trial'], row['status'], row['loss'],
+			       len(rows), len(tasks)))
+
+	if nprocs == 1:
+		_init_worker(training_data,
+		             make_pruner({}, _NullLock()), options['seed'])
+		for task in tasks:
+			collect(_run_trial(task))
+	else:
+		with multiprocessing.Manager() as manager:
+			pruner = make_pruner(manager.dict(), manager.Lock())
+			pool = multiprocessing.Pool(nprocs,
+			                            initializer=_init_worker,
+			                            initargs=(training_data,
+			                                      pruner,
+			                                      options['seed']))
+			try:
+				for row in pool.imap_unordered(_run_trial,
+				                               tasks):
+					collect(row)
+			finally:
+				pool.terminate()
+
+	rows.sort(key=lambda row: np.inf if row['loss'] is None\
+		else row['loss'])
+
+	if options['results_file'] is not None:
+		write_results_table(rows, options['results_file'])
+
+	return rows
+
+def write_results_table(rows, filename):
+
+	"""
+	Writes the results table of a sweep to a CSV file.
+
+	Args:
+		rows: list[dictionary]
+			Results table returned by run_sweep.
+		filename: string
+			Name of the CSV file.
+	"""
+
+	columns = []
+	for row in rows:
+		for key in row:
+			if key not in columns:
+				columns.append(key)
+
+	with open(filename, 'w', newline='') as f:
+		writer = csv.DictWriter(f, fieldnames=columns)
+		writer.writeheader()
+		for row in rows:
+			writer.writerow(row)
@@ -15,8 +15,15 @@
 #    limitations under the License.
 ##############################################################################
 
+import hashlib
+import json
+import os
+
 from math import log
 
+import numpy as np
+from scipy.optimize import OptimizeResult
+
 def crossentropy(training_data_computed):
 
 	"""
@@ -51,3 +58,168 @@ def crossentropy(training_data_computed):
 	out = out / len(training_data_computed)
 
 	return out
+
+def crossentropy_derivative(training_data_computed):
+
+	"""
+	Derivatives of the cross entropy loss with respect to the output of the
+	classifier on each data point.
+
+	Args:
+		training_data_computed: list[(list,{0,1},float)]
+			See crossentropy.
+
+	Returns:
+		A numpy array with the derivative for each data point.
+	"""
+
+	labels = np.array([tuple[1] for tuple in training_data_computed],
+			  dtype=float)
+	outputs = np.array([tuple[2] for tuple in training_data_computed],
+			   dtype=float)
+
+	# crossentropy clips log(y) for y <= 0, where it is constant
+	out = np.zeros(len(outputs))
+	mask = outputs > 0
+	out[mask] -= labels[mask]/outputs[mask]
+	mask = outputs < 1
+	out[mask] += (1-labels[mask])/(1-outputs[mask])
+
+	return out/len(training_data_computed)
+
+# Objective functions with a known derivative can be used for gradient-based
+# training on the local simulator, see QClassifier.gradient
+crossentropy.derivative = crossentropy_derivative
+
+def save_checkpoint(filename, state):
+
+	"""
+	Saves the state of a training run to a JSON file. The file is replaced
+	atomically, so that an interruption while saving leaves the previous
+	checkpoint intact.
+
+	Args:
+		filename: string
+			Name of the checkpoint file.
+		state: dictionary
+			Training state made of lists, floats and strings, see
+			QClassifier.train.
+	"""
+
+	tmp_filename = filename+'.tmp'
+	with open(tmp_filename, 'w') as f:
+		json.dump(state, f)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_filename, filename)
+
+def data_fingerprint(data_set):
+
+	"""
+	Hash of the features and labels of a data set, saved in checkpoints
+	to detect resuming on different training data.
+
+	Args:
+		data_set: list[(list,{0,1})]
+			A list of tuples (feature, label).
+	"""
+
+	features = np.array([tuple[0] for tuple in data_set], dtype='<f8')
+	labels = np.array([tuple[1] for tuple in data_set], dtype='<i8')
+	digest = hashlib.sha256()
+	digest.update(str(features.shape).encode('utf-8'))
+	digest.update(features.tobytes())
+	digest.update(labels.tobytes())
+	return digest.hexdigest()
+
+def load_checkpoint(filename):
+
+	"""
+	Loads the state of a training run saved by save_checkpoint.
+
+	Args:
+		filename: string
+			Name of the checkpoint file.
+
+	Returns:
+		The training state as a dictionary.
+	"""
+
+	with open(filename) as f:
+		return json.load(f)
+
+# Default settings of the SPSA optimizer
+SPSA_OPTIONS_DEFAULT = {
+	'a':0.2,	# Step size gain a_k = a/(k+1+A)^alpha
+	'A':None,	# Stability constant, None for 10% of maxiter
+	'alpha':0.602,
+	'c':0.1,	# Perturbation gain c_k = c/(k+1)^gamma
+	'gamma':0.101,
+	'averaging':1,	# Number of last iterates averaged for the result
+	'seed':None,	# Seed of the random perturbations
+}
+
+def spsa_minimize(func, x0, maxiter, options=SPSA_OPTIONS_DEFAULT,
+		  callback=None):
+
+	"""
+	Minimizes a noisy function with simultaneous perturbation stochastic
+	approximation (SPSA, see Spall, IEEE Trans. Autom. Control 37, 332
+	(1992)). Every iteration evaluates the function twice, at
+		x + c_k d   and   x - c_k d
+	for a random direction d of +1/-1 entries, whatever the number of
+	parameters, and moves x along the resulting gradient estimate.
+
+	Args:
+		func: function handle
+			Function to be minimized.
+		x0: list[float]
+			Initial point.
+		maxiter: int
+			Number of iterations.
+		options: dictionary
+			Gain schedules and other settings, see
+			SPSA_OPTIONS_DEFAULT.
+		callback: function handle
+			Called before every update as callback(x, loss) where
+			loss is the average of the two function values, an
+			estimate of func(x).
+
+	Returns:
+		A scipy OptimizeResult whose x is the average of the last
+		options['averaging'] iterates.
+	"""
+
+	a = options['a']
+	A = options['A']
+	if A is None:
+		A = 0.1*maxiter
+	alpha = options['alpha']
+	c = options['c']
+	gamma = options['gamma']
+	averaging = max(1, options['averaging'])
+	rng = np.random.RandomState(options['seed'])
+
+	x = np.array(x0, dtype=float)
+	iterates = []
+	nfev = 0
+	for k in range(0, maxiter):
+		ak = a/(k+1+A)**alpha
+		ck = c/(k+1)**gamma
+		direction = rng.choice([-1.0, 1.0], size=len(x))
+
+		loss_plus = func(x + ck*direction)
+		loss_minus = func(x - ck*direction)
+		nfev = nfev + 2
+
+		if callback is not None:
+			callback(x, (loss_plus + loss_minus)/2)
+
+		gradient = (loss_plus - loss_minus)/(2*ck)*direction
+		x = x - ak*gradient
+		iterates.append(x)
+
+	xbest = np.mean(iterates[-averaging:], axis=0) if iterates else x
+
+	return OptimizeResult(x=xbest, nit=maxiter, nfev=nfev, success=True,
+			      message='Maximum number of iterations reached')
@@ -50,36 +50,34 @@ group1 = [[-1.6269012492495667, 2.8732368479226293],
 XOR_TRAINING_DATA = [(x,0) for x in group0] + [(x,1) for x in group1]
 
 # Function which generates XOR-like test data
-def gen_xor(num_points, delta):
+def gen_xor(num_points, delta, seed=None):
 
 	"""
 	Function for generating XOR-like test data.
 
 	Args:
 		num_points: int
-			Number of data points to be generated. Half of them
-			will be labelled 0 and the other half 1.
+			Number of data points to be generated per label. Each
+			label has two clusters of int(num_points/2) points.
 		delta: float
 			Range of perturbation. This determines how spread out
 			the data points are.
+		seed: int
+			Seed of the random number generator. If None, numpy's
+			global random state is used.
 
 	Returns:
 		A list of tuples (list, {0,1}) where the list is the feature
-		vector and {0,1} is the label.
+		vector and {0,1} is the label. See datasets.py for larger and
+		higher-dimensional data sets as numpy arrays.
 	"""
 
+	rng = np.random if seed is None else np.random.RandomState(seed)
+
 	Ndata = int(num_points/2) # Number of data points per point group
-	delta = pi/10 # range of perturbation
-	group0 = [[-pi/2 + np.random.uniform(-delta, delta),\
-			np.random.uniform(-delta, delta)]\
-			for x in range(0, Ndata)] +\
-		[[pi/2 + np.random.uniform(-delta,delta),\
-			pi+np.random.uniform(-delta, delta)]\
-			for x in range(0, Ndata)]
-	group1 = [[-pi/2 + np.random.uniform(-delta,delta),\
-			pi+np.random.uniform(-delta, delta)]\
-			for x in range(0, Ndata)] +\
-		[[pi/2 + np.random.uniform(-delta,delta),\
-			np.random.uniform(-delta, delta)]\
-			for x in range(0, Ndata)]
-	return [(x, 0) for x in group0] + [(x, 1) for x in group1]
+	centers = np.array([[-pi/2, 0], [pi/2, pi],	# labelled 0
+			    [-pi/2, pi], [pi/2, 0]])	# labelled 1
+	points = np.repeat(centers, Ndata, axis=0) +\
+		rng.uniform(-delta, delta, size=(4*Ndata, 2))
+	labels = [0]*(2*Ndata) + [1]*(2*Ndata)
+	return list(zip(points.tolist(), labels))